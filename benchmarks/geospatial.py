@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Measure extraction and assembly speed on synthetic geospatial files.
+
+A corpus of GeoTIFF, NetCDF, HDF5, and shapefile datasets is generated with
+GDAL, netCDF4, and h5py, in configurable sizes and counts, and then timed:
+
+- `extract_metadata` latency per file, for each format
+- `filename2dict` throughput over the whole corpus
+- assembler throughput over the extracted documents
+- end-to-end `extract` + `assemble` files/sec, as run from the command line
+
+Formats whose library is not installed are reported as skipped. Results are
+written as JSON, so that runs on different commits can be compared.
+
+    python benchmarks/geospatial.py [--count N] [--raster-size PIXELS]
+        [--features N] [--formats tif,nc,hdf5,shp] [--jobs N]
+        [--corpus-dir DIR] [--output results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+FORMATS = ["tif", "nc", "hdf5", "shp"]
+
+# UTM zone 16N, so that reprojection to WGS84 is part of what is measured
+UTM_EPSG = 32616
+UTM_ORIGIN = (500000.0, 4500000.0)
+
+
+# ------------ corpus generation ------------------#
+
+
+def make_tif(path, size, rng):
+    from osgeo import gdal, osr
+
+    driver = gdal.GetDriverByName("GTiff")
+    dataset = driver.Create(
+        path, size, size, 1, gdal.GDT_Float32, ["TILED=YES", "COMPRESS=DEFLATE"]
+    )
+    dataset.SetGeoTransform((UTM_ORIGIN[0], 30.0, 0.0, UTM_ORIGIN[1], 0.0, -30.0))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(UTM_EPSG)
+    dataset.SetProjection(srs.ExportToWkt())
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(-9999)
+    band.WriteArray(rng.normal(280, 10, (size, size)).astype("float32"))
+    dataset.SetMetadataItem("TIFFTAG_SOFTWARE", "searchable-files benchmark")
+    dataset.FlushCache()
+    dataset = None
+
+
+def make_nc(path, size, rng):
+    import netCDF4
+    import numpy as np
+
+    with netCDF4.Dataset(path, "w") as dataset:
+        dataset.title = "searchable-files benchmark"
+        dataset.createDimension("time", None)
+        dataset.createDimension("lat", size)
+        dataset.createDimension("lon", size)
+        lat = dataset.createVariable("lat", "f4", ("lat",))
+        lat.units = "degrees_north"
+        lat[:] = np.linspace(30, 50, size)
+        lon = dataset.createVariable("lon", "f4", ("lon",))
+        lon.units = "degrees_east"
+        lon[:] = np.linspace(-100, -80, size)
+        temperature = dataset.createVariable(
+            "temperature", "f4", ("time", "lat", "lon"), zlib=True
+        )
+        temperature.units = "K"
+        temperature.long_name = "air temperature"
+        temperature[0, :, :] = rng.normal(280, 10, (size, size))
+
+
+def make_hdf5(path, size, rng):
+    import h5py
+
+    with h5py.File(path, "w") as hdf_file:
+        # the layout of the SMAP EASE-Grid 2.0 products the hdf5 reader knows
+        hdf_file.create_group("EASE2_global_projection")
+        dataset = hdf_file.create_dataset(
+            "soil_moisture",
+            data=rng.random((size, size), dtype="float32"),
+            compression="gzip",
+        )
+        dataset.attrs["units"] = "cm3/cm3"
+
+
+def make_shp(path, num_features, rng):
+    from osgeo import ogr, osr
+
+    driver = ogr.GetDriverByName("ESRI Shapefile")
+    datasource = driver.CreateDataSource(path)
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(UTM_EPSG)
+    layer = datasource.CreateLayer("points", srs, ogr.wkbPoint)
+    layer.CreateField(ogr.FieldDefn("name", ogr.OFTString))
+    layer.CreateField(ogr.FieldDefn("value", ogr.OFTReal))
+    xs = UTM_ORIGIN[0] + rng.random(num_features) * 100000
+    ys = UTM_ORIGIN[1] + rng.random(num_features) * 100000
+    values = rng.normal(0, 1, num_features)
+    for i in range(num_features):
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField("name", f"point {i}")
+        # leave some values null, so that null counting has something to count
+        if i % 10:
+            feature.SetField("value", float(values[i]))
+        point = ogr.Geometry(ogr.wkbPoint)
+        point.AddPoint_2D(float(xs[i]), float(ys[i]))
+        feature.SetGeometry(point)
+        layer.CreateFeature(feature)
+    datasource = None
+
+
+GENERATORS = {
+    "tif": (make_tif, "raster_size"),
+    "nc": (make_nc, "raster_size"),
+    "hdf5": (make_hdf5, "raster_size"),
+    "shp": (make_shp, "features"),
+}
+
+
+def generate_corpus(corpus_dir, formats, count, sizes, seed=0):
+    # returns {format: [paths]}, and {format: reason} for formats which could
+    # not be generated
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    corpus, skipped = {}, {}
+    for fmt in formats:
+        make, size_option = GENERATORS[fmt]
+        fmt_dir = os.path.join(corpus_dir, fmt)
+        os.makedirs(fmt_dir, exist_ok=True)
+        paths = []
+        try:
+            for i in range(count):
+                path = os.path.join(fmt_dir, f"sample_{i:05d}.{fmt}")
+                if not os.path.exists(path):
+                    make(path, sizes[size_option], rng)
+                paths.append(path)
+        except ImportError as err:
+            skipped[fmt] = f"cannot generate: {err}"
+            continue
+        corpus[fmt] = paths
+    return corpus, skipped
+
+
+# ------------ measurements ------------------#
+
+
+def summarize(timings):
+    if not timings:
+        return {"n": 0}
+    ordered = sorted(timings)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+@contextlib.contextmanager
+def quiet():
+    # the extractor and assembler print progress for every file, which would
+    # otherwise dominate the timings
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def measure_extract_metadata(corpus):
+    from searchable_files.extract.extract_metadata import extract_metadata
+    from searchable_files.extract.probe import FileProbe
+
+    results = {}
+    for fmt, paths in corpus.items():
+        timings, errors = [], []
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                with quiet(), FileProbe(path) as probe:
+                    extract_metadata(probe)
+            except Exception as err:
+                errors.append(f"{os.path.basename(path)}: {type(err).__name__}: {err}")
+                continue
+            timings.append(time.perf_counter() - start)
+        results[fmt] = {**summarize(timings), "errors": errors[:5]}
+    return results
+
+
+def measure_filename2dict(corpus, output_dir):
+    # also writes the documents which the assembler measurement reads
+    from searchable_files.extractor import (
+        Settings,
+        filename2dict,
+        target_file,
+        write_document,
+    )
+    from searchable_files.lib.config import load_settings
+
+    settings = load_settings(
+        os.path.join(REPO_DIR, "data/config/extractor.yaml"), Settings
+    )
+    paths = [path for fmt_paths in corpus.values() for path in fmt_paths]
+    num_failed = 0
+    start = time.perf_counter()
+    for path in paths:
+        try:
+            with quiet():
+                data = filename2dict(None, path, settings)
+        except Exception:
+            num_failed += 1
+            continue
+        write_document(target_file(output_dir, path), data)
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(paths),
+        "failed": num_failed,
+        "seconds": round(elapsed, 3),
+        # only files which were extracted count towards throughput
+        "files_per_sec": (
+            round((len(paths) - num_failed) / elapsed, 2) if elapsed else None
+        ),
+    }
+
+
+def measure_assembler(extracted_dir, output_dir, jobs):
+    from searchable_files.assembler import Settings, assemble
+    from searchable_files.lib.config import load_settings
+
+    settings = load_settings(
+        os.path.join(REPO_DIR, "data/config/assembler.yaml"), Settings
+    )
+    num_files = len(os.listdir(extracted_dir)) if os.path.isdir(extracted_dir) else 0
+    start = time.perf_counter()
+    with quiet():
+        num_docs = assemble(extracted_dir, output_dir, settings, jobs=jobs)
+    elapsed = time.perf_counter() - start
+    return {
+        "documents_in": num_files,
+        "ingest_documents_out": num_docs,
+        "seconds": round(elapsed, 3),
+        "documents_per_sec": round(num_files / elapsed, 2) if elapsed else None,
+    }
+
+
+def measure_end_to_end(corpus_dir, num_datasets, work_dir, jobs):
+    # the same commands a user would run, in a fresh interpreter
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (os.path.abspath(SRC_DIR), env.get("PYTHONPATH")) if p
+    )
+    extracted = os.path.join(work_dir, "extracted")
+    assembled = os.path.join(work_dir, "assembled")
+    commands = [
+        [
+            "extract",
+            "--directory",
+            corpus_dir,
+            "--output",
+            extracted,
+            "--clean",
+            "--no-cache",
+            "--jobs",
+            str(jobs),
+        ],
+        [
+            "assemble",
+            "--directory",
+            extracted,
+            "--output",
+            assembled,
+            "--clean",
+            "--jobs",
+            str(jobs),
+        ],
+    ]
+    start = time.perf_counter()
+    for args in commands:
+        subprocess.run(
+            [sys.executable, "-c", "from searchable_files import cli; cli()", *args],
+            cwd=REPO_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+    elapsed = time.perf_counter() - start
+    # a shapefile and its sidecars count as one file, as they do for the extractor
+    return {
+        "files": num_datasets,
+        "jobs": jobs,
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(num_datasets / elapsed, 2) if elapsed else None,
+    }
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20, help="files per format")
+    parser.add_argument(
+        "--raster-size", type=int, default=512, help="raster width and height"
+    )
+    parser.add_argument(
+        "--features", type=int, default=10000, help="features per shapefile"
+    )
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="worker processes for end-to-end runs"
+    )
+    parser.add_argument(
+        "--corpus-dir",
+        help="generate (or reuse) the corpus here instead of a temporary directory",
+    )
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args()
+
+    formats = [fmt for fmt in args.formats.split(",") if fmt]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="searchable-files-bench-")
+    corpus_dir = args.corpus_dir or os.path.join(work_dir, "corpus")
+    sizes = {"raster_size": args.raster_size, "features": args.features}
+    try:
+        start = time.perf_counter()
+        corpus, skipped = generate_corpus(corpus_dir, formats, args.count, sizes)
+        generation_seconds = time.perf_counter() - start
+
+        extracted_dir = os.path.join(work_dir, "extracted")
+        results = {
+            "extract_metadata": measure_extract_metadata(corpus),
+            "filename2dict": measure_filename2dict(corpus, extracted_dir),
+            "assembler": measure_assembler(
+                extracted_dir, os.path.join(work_dir, "assembled"), args.jobs
+            ),
+        }
+        if corpus:
+            results["end_to_end"] = measure_end_to_end(
+                corpus_dir,
+                sum(len(paths) for paths in corpus.values()),
+                os.path.join(work_dir, "end_to_end"),
+                args.jobs,
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "geospatial",
+        "python": sys.version.split()[0],
+        "commit": git_commit(),
+        "parameters": {
+            "count": args.count,
+            "raster_size": args.raster_size,
+            "features": args.features,
+            "formats": formats,
+            "jobs": args.jobs,
+        },
+        "corpus_generation_seconds": round(generation_seconds, 3),
+        "skipped_formats": skipped,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Measure how long each `searchable-files` subcommand takes to start.
+
+Each subcommand is run with `--help` in a fresh interpreter several times, and the
+median wall-clock time is reported along with any heavy geospatial libraries which
+were imported along the way (there should be none).
+
+    python benchmarks/import_time.py [--repeat N] [--output results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SUBCOMMANDS = [
+    None,
+    "login",
+    "logout",
+    "create-index",
+    "show-index",
+    "set-index",
+    "extract",
+    "assemble",
+    "submit",
+    "watch",
+    "query",
+]
+
+HEAVY_MODULES = ["osgeo", "netCDF4", "pyhdf", "h5py", "pyproj", "numpy"]
+
+PROBE = """\
+import json, sys
+from searchable_files import cli
+try:
+    cli(sys.argv[1:], standalone_mode=False)
+except SystemExit:
+    pass
+heavy = {heavy!r}
+print(json.dumps(sorted(m for m in heavy if m in sys.modules)), file=sys.stderr)
+"""
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def run_once(subcommand):
+    args = [sys.executable, "-c", PROBE.format(heavy=HEAVY_MODULES)]
+    if subcommand:
+        args.append(subcommand)
+    args.append("--help")
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (os.path.abspath(SRC_DIR), env.get("PYTHONPATH")) if p
+    )
+    start = time.perf_counter()
+    proc = subprocess.run(args, env=env, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+    heavy = json.loads(proc.stderr.strip().splitlines()[-1])
+    return elapsed, heavy
+
+
+def measure(subcommand, repeat):
+    timings, heavy = [], []
+    for _ in range(repeat):
+        elapsed, heavy = run_once(subcommand)
+        timings.append(elapsed)
+    return {
+        "subcommand": subcommand or "(none)",
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "heavy_modules": heavy,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args()
+
+    results = {
+        "benchmark": "import_time",
+        "python": sys.version.split()[0],
+        "results": [measure(cmd, args.repeat) for cmd in SUBCOMMANDS],
+    }
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Measure submission, task watching, and pipeline throughput against a local fake.
+
+Everything talks to `FakeSearchClient` instead of Globus Search, so no network
+access or login is needed. The fake's latency, failure rate, and task
+completion time are configurable. The measurements are:
+
+- `submit_all` documents/sec at each submission concurrency
+- `watch_tasks` wall time, and number of polls, until every task is done
+- end-to-end `run_pipeline` (extract, assemble, ingest) files/sec
+
+The pipeline is reported as skipped if the extractor's dependencies are not
+installed. Results are written as JSON, so that runs on different commits, or
+with different fake settings, can be compared.
+
+    python benchmarks/search.py [--docs N] [--entries N] [--concurrency 1,4,16]
+        [--latency SECONDS] [--failure-rate F] [--task-seconds SECONDS]
+        [--files N] [--output results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+INDEX_ID = "00000000-0000-4000-8000-000000000000"
+
+
+class CountingClient:
+    # counts the calls made through a client, by method name
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def counted(*args, **kwargs):
+            with self._lock:
+                self.calls[name] = self.calls.get(name, 0) + 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+# ------------ inputs ------------------#
+
+
+def make_ingest_docs(directory, num_docs, entries_per_doc):
+    from searchable_files.lib import jsonio
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for docid in range(num_docs):
+        entries = [
+            {
+                "subject": str(uuid.uuid4()),
+                "visible_to": ["public"],
+                "content": {
+                    "name": f"file-{docid}-{n}.csv",
+                    "tags": ["csv", "file", "text"],
+                    "extension": "csv",
+                    "size_bytes": 1024 * n,
+                },
+            }
+            for n in range(entries_per_doc)
+        ]
+        path = os.path.join(directory, f"ingest_doc_{docid}.json")
+        jsonio.write(
+            path,
+            {"ingest_type": "GMetaList", "ingest_data": {"gmeta": entries}},
+            "compact",
+        )
+        paths.append(path)
+    return paths
+
+
+def make_text_files(directory, num_files):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for n in range(num_files):
+        path = os.path.join(directory, f"series-{n}.csv")
+        with open(path, "w") as fp:
+            fp.write("time,value\n")
+            fp.writelines(f"{t},{t * 0.5}\n" for t in range(1000))
+        paths.append(path)
+    return paths
+
+
+# ------------ measurements ------------------#
+
+
+def fake_client(work_dir, name, fake_options):
+    from searchable_files.lib.fake_search import FakeSearchClient
+
+    return FakeSearchClient(os.path.join(work_dir, f"{name}.sqlite"), **fake_options)
+
+
+def measure_submit(doc_paths, work_dir, concurrency, fake_options):
+    from searchable_files.submitter import submit_all
+
+    client = CountingClient(
+        fake_client(work_dir, f"submit-{concurrency}", fake_options)
+    )
+    task_file = os.path.join(work_dir, f"tasks-{concurrency}.txt")
+    start = time.perf_counter()
+    failures = submit_all(client, INDEX_ID, doc_paths, task_file, concurrency)
+    elapsed = time.perf_counter() - start
+    with open(task_file) as fp:
+        task_ids = [line.strip() for line in fp if line.strip()]
+    result = {
+        "concurrency": concurrency,
+        "documents": len(doc_paths),
+        "failed": len(failures),
+        # more calls than documents means retries
+        "ingest_calls": client.calls.get("ingest", 0),
+        "seconds": round(elapsed, 3),
+        "documents_per_sec": round(len(doc_paths) / elapsed, 2) if elapsed else None,
+    }
+    return result, client, task_ids
+
+
+def measure_watch(client, task_ids, concurrency, max_wait):
+    from searchable_files.watcher import watch_tasks
+
+    client.calls.clear()
+    start = time.perf_counter()
+    results = watch_tasks(client, task_ids, max_wait, concurrency)
+    elapsed = time.perf_counter() - start
+    num_polls = client.calls.get("get_task", 0)
+    return {
+        "tasks": len(task_ids),
+        "succeeded": sum(1 for succeeded, _ in results.values() if succeeded),
+        "seconds": round(elapsed, 3),
+        "polls": num_polls,
+        "polls_per_task": round(num_polls / len(task_ids), 2) if task_ids else None,
+    }
+
+
+def measure_pipeline(paths, work_dir, fake_options):
+    try:
+        from searchable_files.pipeline import run_pipeline
+    except ImportError as err:
+        return {"skipped": f"{type(err).__name__}: {err}"}
+
+    # the pipeline reads its settings from data/config, and writes its manifest
+    # under output/, relative to the current directory
+    pipeline_dir = os.path.join(work_dir, "pipeline")
+    os.makedirs(pipeline_dir, exist_ok=True)
+    os.symlink(
+        os.path.join(os.path.abspath(REPO_DIR), "data"),
+        os.path.join(pipeline_dir, "data"),
+    )
+    client = fake_client(work_dir, "pipeline", fake_options)
+    old_cwd = os.getcwd()
+    os.chdir(pipeline_dir)
+    try:
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                task_ids = run_pipeline(None, paths, "list", INDEX_ID, client=client)
+            finally:
+                sys.stdout = stdout
+        elapsed = time.perf_counter() - start
+    finally:
+        os.chdir(old_cwd)
+    return {
+        "files": len(paths),
+        "tasks": len(task_ids),
+        "seconds": round(elapsed, 3),
+        "files_per_sec": round(len(paths) / elapsed, 2) if elapsed else None,
+    }
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return proc.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=200, help="ingest documents")
+    parser.add_argument(
+        "--entries", type=int, default=100, help="entries per ingest document"
+    )
+    parser.add_argument(
+        "--concurrency", default="1,4,16", help="submission concurrencies to try"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds per fake request"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="fraction of fake requests which fail with a 503",
+    )
+    parser.add_argument(
+        "--task-seconds",
+        type=float,
+        default=2.0,
+        help="seconds from submission until a fake task completes",
+    )
+    parser.add_argument(
+        "--watch-concurrency", type=int, default=8, help="as for `watch`"
+    )
+    parser.add_argument("--max-wait", type=int, default=60, help="as for `watch`")
+    parser.add_argument(
+        "--files", type=int, default=50, help="files for the pipeline measurement"
+    )
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args()
+
+    concurrencies = [int(c) for c in args.concurrency.split(",") if c]
+    fake_options = {
+        "latency": args.latency,
+        "failure_rate": args.failure_rate,
+        "task_seconds": args.task_seconds,
+        "seed": 0,
+    }
+
+    work_dir = tempfile.mkdtemp(prefix="searchable-files-bench-")
+    try:
+        doc_paths = make_ingest_docs(
+            os.path.join(work_dir, "assembled"), args.docs, args.entries
+        )
+        submit_results, watch_result = [], None
+        for concurrency in concurrencies:
+            result, client, task_ids = measure_submit(
+                doc_paths, work_dir, concurrency, fake_options
+            )
+            submit_results.append(result)
+            # the tasks of the last (usually most concurrent) run are watched
+            watch_target = client, task_ids
+        if concurrencies:
+            watch_result = measure_watch(
+                *watch_target, args.watch_concurrency, args.max_wait
+            )
+        text_paths = make_text_files(os.path.join(work_dir, "files"), args.files)
+        results = {
+            "submit": submit_results,
+            "watch": watch_result,
+            "pipeline": measure_pipeline(text_paths, work_dir, fake_options),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "benchmark": "search",
+        "python": sys.version.split()[0],
+        "commit": git_commit(),
+        "parameters": {
+            "docs": args.docs,
+            "entries": args.entries,
+            "concurrency": concurrencies,
+            "watch_concurrency": args.watch_concurrency,
+            "files": args.files,
+            **fake_options,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fp:
+            fp.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
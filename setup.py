@@ -18,6 +18,9 @@ setup(
     package_dir={"": "src"},
     entry_points={"console_scripts": [("searchable-files = searchable_files:cli")]},
     install_requires=REQUIREMENTS,
+    # a faster JSON encoder, and bulk geometry parsing for `vector_stats: scan`,
+    # used when installed
+    extras_require={"fast-json": ["orjson"], "fast-geometry": ["shapely>=2"]},
     license="Apache 2.0",
-    python_requires=">=3.6",
+    python_requires=">=3.8",
 )
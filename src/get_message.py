@@ -1,52 +1,70 @@
 import json
+import os
 
 import pika
 
-from searchable_files.assembler import assemble_handler
 from searchable_files.constants import RMQ_NAME, INDEX_ID
-from searchable_files.extractor import extract_handler, Settings, yaml, SETTING_PATH
-from searchable_files.submitter import submit_handler
+from searchable_files.lib.consumer import consume
+from searchable_files.lib.log import flush_logs, setup_logging
+from searchable_files.pipeline import run_pipeline
 
 # Establish a connection to RabbitMQ rabbitmq-server
 RMQ_USER = 'guest'
 RMQ_PASS = 'guest'
 RMQ_HOST_IP = '172.17.0.3'
 
-credentials = pika.PlainCredentials(RMQ_USER, RMQ_PASS)
-connection = pika.BlockingConnection(
-    pika.ConnectionParameters(host=RMQ_HOST_IP, port=5672, virtual_host='/', credentials=credentials))
-channel = connection.channel()
+# number of messages processed at once, each in its own worker process
+RMQ_WORKERS = int(os.getenv('RMQ_WORKERS', os.cpu_count() or 1))
+# number of unacknowledged messages the broker will hand us at a time; a little
+# more than the number of workers, so that a worker never waits on the network
+RMQ_PREFETCH = int(os.getenv('RMQ_PREFETCH', RMQ_WORKERS * 2))
+# seconds between heartbeats; processing happens off the connection thread, so
+# heartbeats keep flowing however long a single file takes
+RMQ_HEARTBEAT = int(os.getenv('RMQ_HEARTBEAT', 60))
 
-# Declare a queue to consume from
-channel.queue_declare(queue=RMQ_NAME)
+# when set, extracted and assembled documents are also written under this
+# directory for debugging; normally they are only kept in memory
+DEBUG_OUTPUT = os.getenv('GEOEDF_DEBUG_OUTPUT')
 
 
-def callback(ch, method, properties, body):
+def process_message(body):
+    # runs in a worker process
     print(" [x] Received %r" % body.decode())
     msg = json.loads(body.decode())
     print("Received message:", msg)
 
-    extract_settings = Settings(yaml.load(open(SETTING_PATH)))
-
     # todo better way to do error handling
-    err = extract_handler(msg['uuid'], msg['path'], True, msg['type'])
-    if err is not None:
-        err_msg = "failed at extrator"
-        return err_msg
-    err = assemble_handler(extract_settings.output_path, True)
-    if err is not None:
-        err_msg = "failed at assembler"
-        return err_msg
-    err = submit_handler("output/worker_metadata/assembled/", "output/worker_metadata/submitted/", INDEX_ID)
-    if err is not None:
-        err_msg = "failed at submitter"
+    try:
+        task_ids = run_pipeline(
+            msg['uuid'], msg['path'], msg['type'], INDEX_ID, debug_output=DEBUG_OUTPUT
+        )
+    except Exception as err:
+        err_msg = f"failed in pipeline: {err}"
         print(f'[callback] err_msg={err_msg}')
         return err_msg
-    print(f'[callback] success in submitter')
+    finally:
+        # worker processes are not shut down cleanly, so nothing is left buffered
+        flush_logs()
+    print(f'[callback] success in submitter, task_ids={task_ids}')
+
+
+def main():
+    setup_logging()
+    credentials = pika.PlainCredentials(RMQ_USER, RMQ_PASS)
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(host=RMQ_HOST_IP, port=5672, virtual_host='/',
+                                  credentials=credentials, heartbeat=RMQ_HEARTBEAT))
+    channel = connection.channel()
+
+    # Declare a queue to consume from
+    channel.queue_declare(queue=RMQ_NAME)
+    channel.basic_qos(prefetch_count=RMQ_PREFETCH)
 
+    # Consume messages from the queue, acknowledging each one only after it has
+    # been processed
+    print(f'Waiting for messages with {RMQ_WORKERS} workers. To exit press CTRL+C')
+    consume(connection, channel, RMQ_NAME, process_message, RMQ_WORKERS)
 
-# Consume messages from the queue
-channel.basic_consume(queue=RMQ_NAME, on_message_callback=callback, auto_ack=True)
 
-print('Waiting for messages. To exit press CTRL+C')
-channel.start_consuming()
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 from __future__ import print_function
 import json
+import logging
 from json.decoder import JSONDecodeError
 import pika
 import sys, os
 
 from searchable_files.extract import raster, vector, common
+from searchable_files.extract.probe import FileProbe
+from searchable_files.lib.consumer import consume
+from searchable_files.lib.log import flush_logs, setup_logging
 
 RMQ_HOST   = str(os.getenv('RMQ_HOST',"rabbitmq"))
 RMQ_USER   = str(os.getenv('RMQ_USER',"rabbitmq"))
@@ -12,6 +16,12 @@ RMQ_PASS   = str(os.getenv('RMQ_PASS',"rabbitmq"))
 RMQ_EXCHANGE = str(os.getenv('RMQ_EXCHANGE',"rabbitmq"))
 RMQ_QUEUE  = str(os.getenv('RMQ_QUEUE',"geoedf-all"))
 
+# number of messages processed at once, each in its own worker process
+RMQ_WORKERS = int(os.getenv('RMQ_WORKERS', os.cpu_count() or 1))
+# number of unacknowledged messages the broker will hand us at a time; a little
+# more than the number of workers, so that a worker never waits on the network
+RMQ_PREFETCH = int(os.getenv('RMQ_PREFETCH', RMQ_WORKERS * 2))
+
 # log file with the complete message when debugging
 DBG_PATH = '/tmp/debug.txt'
 
@@ -21,6 +31,10 @@ LOG_PATH = '/tmp/processed.txt'
 # listing of files that have failed despite 10 requeues
 FAIL_PATH = '/tmp/failed.txt'
 
+# written through buffered handlers, see `setup_logging`
+logger = logging.getLogger('processfile')
+debug_logger = logging.getLogger('processfile_debug')
+
 # setting to true will drop all processing, simply acknowledge
 # messages and write them to debug file
 # logfile will always be written to
@@ -36,7 +50,10 @@ SHAPE_KEY  = 'shape'
 # the status of the filesystem is still the same
 # for e.g. if processing a rename, ensure there is still a file
 # with this new name
-def callback(ch, method, properties, body):
+#
+# runs in a worker process; the message is acknowledged once this returns, see
+# `consume`
+def callback(body):
     '''React to message on queue'''
 
     CMS_EVENT = True
@@ -50,10 +67,7 @@ def callback(ch, method, properties, body):
         data = json.loads(body)
         # print for debug
         if DEBUG:
-            with open(DBG_PATH,'a+') as dbgfile:
-                dbgfile.write("%s\n" % body)
-
-            ch.basic_ack(delivery_tag=method.delivery_tag)
+            debug_logger.info(body)
 
             return
 
@@ -89,8 +103,7 @@ def callback(ch, method, properties, body):
                 source = os.path.normpath(os.path.join(working_dir, paths[2]))
                 destination = os.path.normpath(os.path.join(working_dir, paths[3]))
 
-            with open(LOG_PATH,'a+') as logfile:
-                logfile.write('action: rename...%s to %s\n' % (source,destination))
+            logger.info('action: rename...%s to %s', source, destination)
             # only proceed if destination still exists as a file
 
         elif data['action'] == 'opened-file':
@@ -98,8 +111,7 @@ def callback(ch, method, properties, body):
                 filename = os.path.normpath(os.path.join(data['cwd'],paths[0]))
             else:
                 filename = os.path.normpath(os.path.join(working_dir,paths[1]))
-            with open(LOG_PATH,'a+') as logfile:
-                logfile.write('action: open file...%s\n' % filename)
+            logger.info('action: open file...%s', filename)
             # if this is no longer a valid file, skip
             # possibly out of date message that was requeued
             if os.path.isfile(filename):
@@ -110,7 +122,8 @@ def callback(ch, method, properties, body):
                 # assume that metadata extractor will not raise an exception
                 # a basic dictionary will be returned in the worst case
                 if fileext in raster.extensions:
-                    metadata = raster.getMetadata(filename)
+                    with FileProbe(filename) as probe:
+                        metadata = raster.getMetadata(probe)
                     # register file for preview
                 else:
                     metadata = common.basicData(filename)
@@ -122,32 +135,39 @@ def callback(ch, method, properties, body):
                     requeued = True
                     # requeue_message(ch,body)
 
-        # acknowledge this message
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-
     # some unexpected error occurred
     # no choice but to ack this message and move on
     except JSONDecodeError:
-        with open(LOG_PATH,'a+') as logfile:
-            logfile.write('%s is not a properly formatted JSON message, probably a test mesage\n' % body)
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        logger.info('%s is not a properly formatted JSON message, probably a test mesage', body)
     except:
-        with open(LOG_PATH,'a+') as logfile:
-            logfile.write('unexpected error processing message: %s\n' % body)
-            logfile.write('Exception %s\n' % sys.exc_info()[0])
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        logger.error('unexpected error processing message: %s', body)
+        logger.error('Exception %s', sys.exc_info()[0])
+
+
+def flushing_callback(body):
+    # worker processes are not shut down cleanly, so this message's log lines
+    # are written out before the next one
+    try:
+        callback(body)
+    finally:
+        flush_logs()
 
 
 if __name__ == "__main__":
 
+    setup_logging('processfile', LOG_PATH)
+    setup_logging('processfile_debug', DBG_PATH)
+    # the extract readers log under the package's name
+    setup_logging()
+
     # Connect to our queue in RabbitMQ
     credentials = pika.PlainCredentials(RMQ_USER, RMQ_PASS)
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=RMQ_HOST, credentials=credentials))
     channel    = connection.channel()
     result     = channel.queue_declare(RMQ_QUEUE, durable=True)
 
-    # Set our callback function, wait for msgs
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue=RMQ_QUEUE, on_message_callback=callback)
-    print(' [*] Waiting for messages. To exit press CTRL+C')
-    channel.start_consuming()
+    # Set our callback function, wait for msgs; each message is acknowledged
+    # only after it has been processed
+    channel.basic_qos(prefetch_count=RMQ_PREFETCH)
+    print(f' [*] Waiting for messages with {RMQ_WORKERS} workers. To exit press CTRL+C')
+    consume(connection, channel, RMQ_QUEUE, flushing_callback, RMQ_WORKERS)
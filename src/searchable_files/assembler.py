@@ -1,14 +1,23 @@
-import fnmatch
+import functools
 import json
 import os
 import shutil
 
 import click
-import ruamel.yaml
 
-from .lib import all_filenames, auth_client, common_options, prettyprint_json
-
-yaml = ruamel.yaml.YAML(typ="safe")
+from .lib import (
+    auth_client,
+    common_options,
+    imap_ordered,
+    jsonio,
+    prettyprint_json,
+    profile_option,
+    resolve_jobs,
+)
+from .lib.config import load_settings
+from .lib.globs import GlobSet
+from .lib.store import load_record, open_store
+from .lib.timing import span
 
 
 def _current_user_as_urn():
@@ -49,17 +58,26 @@ def _add_annotations(data, annotations):
 
 
 def build_entries(datafile, settings):
-    print("reading " + datafile)
+    # `datafile` is a reference from `Store.refs()`: a path, or a segment record
+    if isinstance(datafile, str):
+        print(f"reading {datafile}")
     # read data
-    with open(datafile) as fp:
-        data = json.load(fp)
+    data = load_record(datafile)
+
+    return build_entries_from_data(data, settings)
+
 
+def build_entries_from_data(data, settings):
+    with span("assemble"):
+        return _entries_from_data(data, settings)
+
+
+def _entries_from_data(data, settings):
     full_filename = data["identifier"]
 
     # if there are annotations to add, do so
-    for pattern, annotations in settings.file_specific_annotations.items():
-        if fnmatch.fnmatch(full_filename, pattern):
-            _add_annotations(data, annotations)
+    for index in settings.annotation_globs.matching(full_filename):
+        _add_annotations(data, settings.annotations[index])
 
     non_default_entries, non_default_fields = [], []
     for part in settings.doc_parts:
@@ -92,19 +110,89 @@ def build_entries(datafile, settings):
     ]
 
 
-def flush_batch(entry_batch, docid, output_directory):
+def wire_size(entry):
+    # bytes the entry takes up in the ingest request, which globus_sdk encodes
+    # with plain `json.dumps`: ASCII-only, with ", " and ": " separators, so that
+    # it can be larger than the compact UTF-8 encoding (much larger for
+    # non-ASCII text)
+    return len(json.dumps(entry))
+
+
+def encoded_entries(entries):
+    # pair each entry with its compact JSON encoding, and that pair with the size
+    # `iter_batches` budgets for
+    #
+    # the encoding is reused when writing compact and NDJSON ingest documents
+    for entry in entries:
+        yield (entry, jsonio.dumps(entry)), wire_size(entry)
+
+
+def _encoded_entries(datafile, settings):
+    # runs in the worker processes, so that JSON parsing and encoding each entry
+    # happen in parallel
+    return list(encoded_entries(build_entries(datafile, settings)))
+
+
+# bytes taken up by the GMetaList wrapper around the entries of a batch
+BATCH_OVERHEAD_BYTES = 64
+
+
+def iter_batches(sized_entries, settings):
+    # cut a new batch when either the entry count or the serialized size would go
+    # over its limit; an entry which is too large on its own gets a batch to itself
+    batch, batch_bytes = [], BATCH_OVERHEAD_BYTES
+    for entry, size in sized_entries:
+        # +2 for the ", " separating entries
+        if batch and (
+            len(batch) >= settings.max_batch_size
+            or batch_bytes + size + 2 > settings.max_batch_bytes
+        ):
+            yield batch
+            batch, batch_bytes = [], BATCH_OVERHEAD_BYTES
+        batch.append(entry)
+        batch_bytes += size + 2
+    if batch:
+        yield batch
+
+
+def gmeta_list(entry_batch):
+    return {"ingest_type": "GMetaList", "ingest_data": {"gmeta": entry_batch}}
+
+
+# `gmeta_list` in compact JSON, around the already encoded entries
+GMETA_LIST_PREFIX = b'{"ingest_type":"GMetaList","ingest_data":{"gmeta":['
+GMETA_LIST_SUFFIX = b"]}}\n"
+
+
+def flush_batch(encoded_batch, docid, output_directory, output_format="pretty"):
+    # `encoded_batch` is a list of (entry, encoded entry) pairs
+    #
+    # an NDJSON ingest document holds just the entries, one per line; the
+    # submitter wraps them in a GMetaList
     os.makedirs(output_directory, exist_ok=True)
-    fname = os.path.join(output_directory, f"ingest_doc_{docid}.json")
-    with open(fname, "w") as fp:
-        prettyprint_json(
-            {"ingest_type": "GMetaList", "ingest_data": {"gmeta": entry_batch}}, fp
-        )
+    extension = ".ndjson" if output_format == "ndjson" else ".json"
+    fname = os.path.join(output_directory, f"ingest_doc_{docid}{extension}")
+    with span("serialize"), open(fname, "wb") as fp:
+        if output_format == "pretty":
+            entries = [entry for entry, _encoded in encoded_batch]
+            fp.write(jsonio.encode(gmeta_list(entries), "pretty"))
+        elif output_format == "compact":
+            fp.write(GMETA_LIST_PREFIX)
+            fp.write(b",".join(encoded for _entry, encoded in encoded_batch))
+            fp.write(GMETA_LIST_SUFFIX)
+        else:
+            for _entry, encoded in encoded_batch:
+                fp.write(encoded + b"\n")
 
 
 class Settings:
     def __init__(self, data):
         self.max_batch_size = data.get("max_batch_size", 100)
+        self.max_batch_bytes = data.get("max_batch_bytes", 10 * 1000 * 1000)
         self.file_specific_annotations = data.get("file_specific_annotations", {})
+        # patterns are compiled once; `annotations[i]` goes with pattern `i`
+        self.annotation_globs = GlobSet(self.file_specific_annotations)
+        self.annotations = list(self.file_specific_annotations.values())
 
         self.visibility = data.get("visibility")
         self.default_visibility = self.visibility.get("default_visibility", "public")
@@ -114,8 +202,39 @@ class Settings:
 
 def _load_settings_callback(ctx, param, value):
     if value is not None:
-        with open(value) as fp:
-            return Settings(yaml.load(fp))
+        return load_settings(value, Settings)
+
+
+# number of extracted files handed to a worker at a time
+ASSEMBLE_CHUNKSIZE = 16
+
+
+def assemble(directory, output, settings, jobs=1, output_format="pretty"):
+    # a segment store reads its records in file order, so that reading them is
+    # one sequential pass over each segment, and hands the bytes to the workers
+    store = open_store(directory)
+    # entries stream from disk into batches; only the batch being filled and the
+    # files being parsed by the workers are held in memory
+    per_file = imap_ordered(
+        functools.partial(_encoded_entries, settings=settings),
+        store.refs(),
+        jobs=jobs,
+        chunksize=ASSEMBLE_CHUNKSIZE,
+    )
+    sized_entries = (sized for entries in per_file for sized in entries)
+
+    num_docs = 0
+    try:
+        for current_doc_id, batch in enumerate(iter_batches(sized_entries, settings)):
+            flush_batch(batch, current_doc_id, output, output_format)
+            num_docs += 1
+    finally:
+        store.close()
+    # an empty input still produces an (empty) ingest document
+    if num_docs == 0:
+        flush_batch([], 0, output, output_format)
+        num_docs = 1
+    return num_docs
 
 
 @click.command(
@@ -153,51 +272,46 @@ def _load_settings_callback(ctx, param, value):
     callback=_load_settings_callback,
     help="YAML file with configuration for the assembler",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    show_default=True,
+    type=int,
+    help="Number of worker processes used to read extracted metadata. "
+    "Use 0 to start one worker per CPU core",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(jsonio.OUTPUT_FORMATS),
+    default="pretty",
+    show_default=True,
+    help="How to write ingest documents: indented JSON, single-line JSON, or "
+    "NDJSON with one entry per line",
+)
+@profile_option
 @common_options
-def assemble_cli(settings, directory, output, clean):
+def assemble_cli(settings, directory, output, clean, jobs, output_format):
     if clean:
         shutil.rmtree(output, ignore_errors=True)
 
-    entry_docs = []
-    for filename in all_filenames(directory):
-        if not filename.endswith(".DS_Store"):
-            entry_docs.extend(build_entries(filename, settings))
-
-    current_doc_id = 0
-    batch = []
-    for entry in entry_docs:
-        if len(batch) >= settings.max_batch_size:
-            flush_batch(batch, current_doc_id, output)
-            batch = []
-            current_doc_id += 1
-        batch.append(entry)
-    flush_batch(batch, current_doc_id, output)
+    assemble(
+        directory, output, settings, jobs=resolve_jobs(jobs), output_format=output_format
+    )
 
     click.echo("ingest document assembly complete")
     click.echo(f"results visible in\n  {output}")
 
 SETTING_PATH = "data/config/assembler.yaml"
 def assemble_handler(directory, clean):
-    settings = Settings(yaml.load(open(SETTING_PATH)))
+    settings = load_settings(SETTING_PATH, Settings)
 
     output = "output/worker_metadata/assembled/"
     if clean:
         shutil.rmtree(output, ignore_errors=True)
 
-    entry_docs = []
-    for filename in all_filenames(directory):
-        if not filename.endswith(".DS_Store"):
-            entry_docs.extend(build_entries(filename, settings))
-
-    current_doc_id = 0
-    batch = []
-    for entry in entry_docs:
-        if len(batch) >= settings.max_batch_size:
-            flush_batch(batch, current_doc_id, output)
-            batch = []
-            current_doc_id += 1
-        batch.append(entry)
-    flush_batch(batch, current_doc_id, output)
+    assemble(directory, output, settings)
 
     click.echo("ingest document assembly complete")
     click.echo(f"results visible in\n  {output}")
@@ -1,7 +1,5 @@
-import os
 import datetime
 import time
-import uuid
 
 RESOURCE_URL_PREFIX = "https://geoedf-portal.anvilcloud.rcac.purdue.edu/resource"
 SITE_URL_PREFIX = "https://geoedf-portal.anvilcloud.rcac.purdue.edu"
@@ -10,13 +8,13 @@ CREATOR_NAME = "Yiqing Qu"
 CREATOR_EMAIL = "qu112@purdue.edu"
 
 
-def idata2schemaorg(filename, data, file_uuid, settings):
-    info = os.stat(filename)
+def idata2schemaorg(probe, data, file_uuid, settings):
     # print(data)
     spatial_coverage = get_spatial_coverage(data)
     print("spatial_coverage" + str(spatial_coverage))
     creator = get_creator(data, AFFILIATION_NAME, CREATOR_NAME, CREATOR_EMAIL)
     identifier = get_identifier_list(data, file_uuid)
+    variable_measured = get_variable_measured(data)
 
     schemaorg_json = {
         "@context": "https://schema.org",
@@ -26,8 +24,8 @@ def idata2schemaorg(filename, data, file_uuid, settings):
 
         "@type": "Dataset",
         # "additionalType": "link",
-        "name": os.path.basename(filename),
-        "description": f'This publication {os.path.basename(filename)} is a resource in GeoEDF Portal. ',
+        "name": probe.basename,
+        "description": f'This publication {probe.basename} is a resource in GeoEDF Portal. ',
         # "description": read_head(filename, settings),
         "keywords": ["Keyword1", "Keyword2", "Keyword3"],
 
@@ -67,7 +65,7 @@ def idata2schemaorg(filename, data, file_uuid, settings):
         },
 
         "isAccessibleForFree": True,
-        "dateModified": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(),
+        "dateModified": probe.mtime,
         "datePublished": datetime.datetime.now().isoformat(),
         "subjectOf": {
             "@type": "DataDownload",
@@ -77,6 +75,11 @@ def idata2schemaorg(filename, data, file_uuid, settings):
             "encodingFormat": "application/rdf+xml"
         },
     }
+    if variable_measured:
+        schemaorg_json["variableMeasured"] = variable_measured
+    size = get_size(data)
+    if size is not None:
+        schemaorg_json["size"] = size
 
     return schemaorg_json
 
@@ -105,8 +108,82 @@ def get_spatial_coverage(data):
     }
 
 
+# subdata fields which have a schema.org PropertyValue counterpart; any others
+# (like a band's mean or data type) are listed under `additionalProperty`
+PROPERTY_VALUE_FIELDS = {
+    'title': 'name',
+    'description': 'description',
+    'units': 'unitText',
+    'min': 'minValue',
+    'max': 'maxValue',
+}
+
+
+def get_variable_measured(data):
+    # the bands or variables of a raster, from its `subdata`, or the geometries
+    # and fields of a vector layer, as a list of PropertyValues
+    if data is None:
+        return []
+    variables = []
+    for subdata in data.get('subdata', {}).values():
+        variable = {"@type": "PropertyValue"}
+        additional = []
+        for key, value in subdata.items():
+            if value is None:
+                continue
+            if key in PROPERTY_VALUE_FIELDS:
+                variable[PROPERTY_VALUE_FIELDS[key]] = value
+            elif key == 'summary':
+                # a netCDF variable's shape, type, and storage layout; the
+                # variable's own attributes win over a summary field of the
+                # same name
+                additional.extend(
+                    {"@type": "PropertyValue", "name": name, "value": value}
+                    for name, value in value.items()
+                    if name not in subdata
+                )
+            else:
+                additional.append({"@type": "PropertyValue", "name": key, "value": value})
+        if additional:
+            variable["additionalProperty"] = additional
+        variables.append(variable)
+
+    # a scanned vector layer: its geometries by type, and its attribute fields
+    # with the number of features which leave each of them empty
+    geometry_types = data.get('geometryTypes')
+    if geometry_types:
+        variables.append({
+            "@type": "PropertyValue",
+            "name": "geometry",
+            "additionalProperty": [
+                {"@type": "PropertyValue", "name": name, "value": count}
+                for name, count in geometry_types.items()
+            ],
+        })
+    for name, null_count in data.get('fieldNullCounts', {}).items():
+        variables.append({
+            "@type": "PropertyValue",
+            "name": name,
+            "additionalProperty": [
+                {"@type": "PropertyValue", "name": "nullCount", "value": null_count}
+            ],
+        })
+    return variables
+
+
+def get_size(data):
+    # the number of features of a vector layer
+    if data is None or data.get('featureCount') is None:
+        return None
+    return {
+        "@type": "QuantitativeValue",
+        "value": data['featureCount'],
+        "unitText": "features",
+    }
+
+
 def get_identifier_list(data, file_uuid):
-    return [f'{RESOURCE_URL_PREFIX/uuid}'] # todo check the form of identifier
+    return [f'{RESOURCE_URL_PREFIX}/{file_uuid}'] # todo check the form of identifier
     #
     # if data is None:
     #     return None
@@ -122,7 +199,7 @@ def get_identifier_list(data, file_uuid):
     # return [identifier]
 
 
-def get_creator(data, affiliation, name, email, url):
+def get_creator(data, affiliation, name, email, url=None):
     if url is None:
         url = SITE_URL_PREFIX+"/accounts/profile/"
     return {
@@ -0,0 +1,62 @@
+import collections
+import functools
+import hashlib
+
+import pyproj
+from osgeo import osr
+
+# CRS objects and transformations to WGS84 are expensive to set up and most
+# trees only use a handful of projections, so they are built once per process
+# and shared by every format reader
+#
+# like the objects they hold, these caches are not meant to be shared between
+# threads; extraction runs in worker processes
+CACHE_SIZE = 64
+
+WGS84 = "EPSG:4326"
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def transformer_to_wgs84(source):
+    # `source` is anything pyproj understands, e.g. "EPSG:32616" or a PROJ string
+    # the result always takes and returns (x, y) / (lon, lat) order
+    return pyproj.Transformer.from_crs(source, WGS84, always_xy=True)
+
+
+def epsg_transformer_to_wgs84(epsg_code):
+    return transformer_to_wgs84(f"EPSG:{epsg_code}")
+
+
+# WKT strings can be several kilobytes long, so this cache is keyed on a digest
+# rather than on the string itself
+_osr_transformations = collections.OrderedDict()
+
+
+def osr_transformation_to_wgs84(projection_wkt):
+    key = hashlib.sha1(projection_wkt.encode("utf-8")).hexdigest()
+    if key in _osr_transformations:
+        _osr_transformations.move_to_end(key)
+        return _osr_transformations[key]
+
+    sourceSR = osr.SpatialReference()
+    if sourceSR.ImportFromWkt(projection_wkt) != 0:
+        raise ValueError("not a usable projection")
+    targetSR = _osr_wgs84()
+    # GDAL 3 otherwise follows the CRS axis order, which is lat/lon for EPSG:4326
+    if hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+        sourceSR.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    transformation = osr.CoordinateTransformation(sourceSR, targetSR)
+
+    _osr_transformations[key] = transformation
+    if len(_osr_transformations) > CACHE_SIZE:
+        _osr_transformations.popitem(last=False)
+    return transformation
+
+
+@functools.lru_cache(maxsize=1)
+def _osr_wgs84():
+    targetSR = osr.SpatialReference()
+    targetSR.ImportFromEPSG(4326)
+    if hasattr(osr, "OAMS_TRADITIONAL_GIS_ORDER"):
+        targetSR.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return targetSR
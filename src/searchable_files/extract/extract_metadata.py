@@ -1,14 +1,13 @@
-from . import raster
-from . import vector
-import os.path
+from ..lib.timing import span
+from . import registry
+from .probe import FileProbe
 
 
-def extract_metadata(filepath):
-    root, ext = os.path.splitext(filepath)
-    if ext in vector.extensions:
-        return vector.getMetadata(filepath)
-    elif ext in raster.extensions:
-        return raster.getMetadata(filepath)
+def extract_metadata(probe):
+    handler = registry.get_handler(probe.dispatch_extension)
+    if handler is not None:
+        with span("parse", extension=probe.dispatch_extension):
+            return handler(probe)
 
 
 if __name__ == "__main__":
@@ -29,4 +28,5 @@ if __name__ == "__main__":
         # filepath = "sample_files/sresa1b_ncar_ccsm3-example.nc"
         # filepath = "sample_files/county83.shp"
 
-    print(json.dumps(extract_metadata(filepath), indent=3))
+    with FileProbe(filepath) as probe:
+        print(json.dumps(extract_metadata(probe), indent=3))
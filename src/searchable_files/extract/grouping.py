@@ -0,0 +1,77 @@
+import itertools
+import os
+
+from . import registry
+
+
+def _primary_stem(filename, primaries):
+    # the stem this file shares with a primary file it is a sidecar of, or None
+    lowered = filename.lower()
+    for primary_extension, sidecar_extensions in registry.SIDECAR_EXTENSIONS.items():
+        for sidecar_extension in sidecar_extensions:
+            if lowered.endswith(sidecar_extension):
+                stem = filename[: -len(sidecar_extension)]
+                if primaries.get(stem, (None,))[0] == primary_extension:
+                    return stem
+    return None
+
+
+def _identity(item):
+    return item
+
+
+def _group_directory(items, key):
+    # stem -> (lowercased extension, name) of the primary file with that stem
+    primaries = {}
+    for item in items:
+        filename = key(item)
+        stem, ext = os.path.splitext(filename)
+        if ext.lower() in registry.SIDECAR_EXTENSIONS:
+            primaries[stem] = (ext.lower(), filename)
+
+    datasets = {}
+    for item in items:
+        filename = key(item)
+        stem = _primary_stem(filename, primaries)
+        if stem is None:
+            datasets.setdefault(filename, [])
+        else:
+            datasets.setdefault(primaries[stem][1], []).append(item)
+    # a sidecar may be listed before its primary file; order by the primary
+    for item in items:
+        filename = key(item)
+        if filename in datasets:
+            yield item, sorted(datasets.pop(filename), key=key)
+
+
+def group_datasets(items, key=_identity):
+    """
+    Fold sidecar files (like the .shx, .dbf, and .prj of a shapefile) into the
+    primary file they belong to, yielding (primary, [sidecars]) pairs.
+
+    `key` gives the path of each item, so that walker entries can be grouped as
+    well as plain filenames.
+
+    Sidecars always sit next to their primary file, and the walker lists a
+    directory's files together, so only one directory is held at a time.
+    A sidecar whose primary file is missing is yielded on its own.
+    """
+
+    def dirname(item):
+        return os.path.dirname(key(item))
+
+    for _dirname, group in itertools.groupby(items, key=dirname):
+        yield from _group_directory(list(group), key)
+
+
+def sidecars_of(filename):
+    # the sidecar files next to a single primary file, for callers which are
+    # handed one path rather than a directory to walk
+    if os.path.splitext(filename)[1].lower() not in registry.SIDECAR_EXTENSIONS:
+        return []
+    dirname = os.path.dirname(filename)
+    neighbours = [os.path.join(dirname, f) for f in os.listdir(dirname or ".")]
+    for primary, sidecars in _group_directory(neighbours, _identity):
+        if primary == filename:
+            return sidecars
+    return []
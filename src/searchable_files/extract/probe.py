@@ -0,0 +1,172 @@
+import datetime
+import io
+import os
+import stat
+
+from identify import identify
+
+from ..lib.timing import span
+from . import sniff
+
+# minimum number of bytes read from the start of each file
+# the same bytes serve type detection and the `head` preview
+HEAD_BYTES = 8192
+
+# points sampled along each edge of a raster when computing its WGS84 bounds;
+# under curved projections the edges bow outwards, so corners alone are not enough
+EDGE_POINTS = 21
+
+
+class FileProbe:
+    """
+    The state shared by every stage which looks at a single file.
+
+    The file is stat'ed and its head is read at most once. GDAL, OGR, and netCDF
+    handles are opened on first use and then shared by every reader which asks
+    for them, until `close()` is called.
+
+    `exact_stats` asks readers for exact (full scan) statistics of raster
+    bands, instead of approximating them for large rasters. `scan_features`
+    asks for statistics of vector layers which take reading every feature.
+    `edge_points` is the number of points along each edge of the outline which
+    gives the bounds of a raster.
+    """
+
+    def __init__(
+        self,
+        path,
+        info=None,
+        head_size=HEAD_BYTES,
+        exact_stats=False,
+        scan_features=False,
+        edge_points=EDGE_POINTS,
+    ):
+        self.path = path
+        self.exact_stats = exact_stats
+        self.scan_features = scan_features
+        self.edge_points = edge_points
+        self._info = info
+        self._head_size = max(head_size, HEAD_BYTES)
+        self._head = None
+        self._format = None
+        self._tags = None
+        self._gdal_dataset = None
+        self._ogr_dataset = None
+        self._netcdf_dataset = None
+
+    @property
+    def info(self):
+        if self._info is None:
+            self._info = os.stat(self.path)
+        return self._info
+
+    @property
+    def mtime(self):
+        return datetime.datetime.fromtimestamp(self.info.st_mtime).isoformat()
+
+    @property
+    def basename(self):
+        return os.path.basename(self.path)
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.path)[1]
+
+    @property
+    def head(self):
+        if self._head is None:
+            with span("open", kind="head"), open(self.path, "rb") as fp:
+                self._head = fp.read(self._head_size)
+        return self._head
+
+    @property
+    def format(self):
+        # detected from the magic number at the start of the file, or None
+        if self._format is None:
+            self._format = sniff.sniff_format(self.head) or ""
+        return self._format or None
+
+    @property
+    def dispatch_extension(self):
+        # the extension whose handler should read this file, corrected by its
+        # content when the real extension is missing or wrong
+        return sniff.dispatch_extension(self.extension, self.format)
+
+    def head_text(self, length):
+        # a multi-byte character may be cut off at the end of the buffer, so
+        # undecodable bytes are dropped rather than raising
+        return self.head.decode("utf-8", errors="ignore")[:length]
+
+    @property
+    def tags(self):
+        # equivalent to `identify.tags_from_path`, but using the stat result and
+        # head bytes which are already in hand instead of reading the file again
+        if self._tags is None:
+            tags = {identify.FILE}
+            executable = bool(
+                self.info.st_mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+            )
+            tags.add(identify.EXECUTABLE if executable else identify.NON_EXECUTABLE)
+
+            by_name = identify.tags_from_filename(self.basename)
+            if by_name:
+                tags.update(by_name)
+            elif executable:
+                shebang = identify.parse_shebang(io.BytesIO(self.head))
+                if shebang:
+                    tags.update(identify.tags_from_interpreter(shebang[0]))
+
+            if self.format is not None:
+                # every format with a signature is a binary one, whatever the
+                # file is named
+                tags.discard(identify.TEXT)
+                tags.update((self.format, identify.BINARY))
+            if not identify.ENCODING_TAGS & tags:
+                if identify.is_text(io.BytesIO(self.head)):
+                    tags.add(identify.TEXT)
+                else:
+                    tags.add(identify.BINARY)
+            self._tags = tags
+        return self._tags
+
+    # the geospatial libraries are imported on first use, so that probing a
+    # plain text file does not require them
+
+    def gdal_dataset(self):
+        if self._gdal_dataset is None:
+            from osgeo import gdal
+
+            with span("open", kind="gdal"):
+                self._gdal_dataset = gdal.Open(self.path)
+        return self._gdal_dataset
+
+    def ogr_dataset(self, driver_name):
+        if self._ogr_dataset is None:
+            from osgeo import ogr
+
+            driver = ogr.GetDriverByName(driver_name)
+            with span("open", kind="ogr"):
+                self._ogr_dataset = driver.Open(self.path)
+        return self._ogr_dataset
+
+    def netcdf_dataset(self):
+        if self._netcdf_dataset is None:
+            import netCDF4
+
+            with span("open", kind="netcdf"):
+                self._netcdf_dataset = netCDF4.Dataset(self.path)
+        return self._netcdf_dataset
+
+    def close(self):
+        if self._netcdf_dataset is not None:
+            self._netcdf_dataset.close()
+            self._netcdf_dataset = None
+        # GDAL/OGR datasets are closed when the last reference is dropped
+        self._gdal_dataset = None
+        self._ogr_dataset = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,95 +1,85 @@
 # from pyproj import Proj, transform
-from osgeo import gdal, osr, ogr
-from .raster_files import hdf4
-from .raster_files import hdf5
-from .raster_files import nc
-from .raster_files import tif
+import logging
+
+import numpy as np
+from ..lib.timing import span
+from . import crs
+from . import registry
 from .common import commonData
 from .common import geoData
-import os
 
-extensions = ['.hdf4', '.hdf', '.hdf5', '.nc', '.tif']
+extensions = list(registry.RASTER_HANDLERS)
 
-LOG_PATH = '/tmp/messages.txt'
+logger = logging.getLogger(__name__)
 
 
 # --------------- for datasource file ------------------#
-def getCoverage(datasource):
+def getOutline(datasource, edge_points):
+    # coordinates, in the raster's own CRS, of `edge_points` evenly spaced points
+    # along each of its four edges (clockwise from the upper left corner)
     upx, xres, xskew, upy, yskew, yres = datasource.GetGeoTransform()
     cols = datasource.RasterXSize
     rows = datasource.RasterYSize
 
-    ulx = upx + 0 * xres + 0 * xskew
-    uly = upy + 0 * yskew + 0 * yres
-
-    llx = upx + 0 * xres + rows * xskew
-    lly = upy + 0 * yskew + rows * yres
-
-    lrx = upx + cols * xres + rows * xskew
-    lry = upy + cols * yskew + rows * yres
-
-    urx = upx + cols * xres + 0 * xskew
-    ury = upy + cols * yskew + 0 * yres
-
-    return ulx, uly, llx, lly, lrx, lry, urx, ury
-
-
-def getMetadata(filepath):
+    steps = np.linspace(0.0, 1.0, edge_points)
+    zeros = np.zeros(edge_points)
+    ones = np.ones(edge_points)
+    # top, right, bottom, and left edges, as fractions of the raster size
+    pixels = np.concatenate([steps, ones, steps[::-1], zeros]) * cols
+    lines = np.concatenate([zeros, steps, ones, steps[::-1]]) * rows
+    x = upx + pixels * xres + lines * xskew
+    y = upy + pixels * yskew + lines * yres
+    return x, y
+
+
+def transformOutline(x, y, projection_wkt):
+    # reproject all outline points to WGS84 longitude/latitude in a single call
+    with span("reproject"):
+        coordTrans = crs.osr_transformation_to_wgs84(projection_wkt)
+        points = np.asarray(
+            coordTrans.TransformPoints(np.column_stack([x, y]).tolist())
+        )
+    lon, lat = points[:, 0], points[:, 1]
+    # points which could not be transformed come back as inf
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    if not valid.any():
+        raise ValueError('no outline point could be transformed')
+    return lon[valid], lat[valid]
+
+
+def getMetadata(probe):
     data = {}
-    filename, ext = os.path.splitext(filepath)
-    if (ext == '.hdf4' or ext == '.hdf'):
-        data = hdf4.getMetadata(filepath)
-    elif (ext == '.hdf5'):
-        data = hdf4.getMetadata(filepath)
-    elif (ext == '.nc'):
-        data = nc.getMetadata(filepath)
-    elif (ext == '.tif'):
-        data = tif.getMetadata(filepath)
+    # format readers are imported on first use, see `registry`
+    reader = registry.get_handler(
+        probe.dispatch_extension, registry.RASTER_FORMAT_READERS
+    )
+    if reader is not None:
+        data = reader(probe)
 
-    datasource = gdal.Open(filepath)
+    # shared with the format reader above, which has usually opened it already
+    datasource = probe.gdal_dataset()
 
     data['xsize'] = datasource.RasterXSize
     data['ysize'] = datasource.RasterYSize
-    ulx, uly, llx, lly, lrx, lry, urx, ury = getCoverage(datasource)
+    x, y = getOutline(datasource, probe.edge_points)
     # get projection info
     try:
-        sourceSR = osr.SpatialReference()
-        sourceSR.ImportFromWkt(datasource.GetProjectionRef())
-        targetSR = osr.SpatialReference()
-        targetSR.ImportFromEPSG(4326)
-        coordTrans = osr.CoordinateTransformation(sourceSR, targetSR)
-
-        ul = ogr.CreateGeometryFromWkt("POINT (%f %f)" % (ulx, uly))
-        ll = ogr.CreateGeometryFromWkt("POINT (%f %f)" % (llx, lly))
-        ur = ogr.CreateGeometryFromWkt("POINT (%f %f)" % (urx, ury))
-        lr = ogr.CreateGeometryFromWkt("POINT (%f %f)" % (lrx, lry))
-
-        ul.Transform(coordTrans)
-        ll.Transform(coordTrans)
-        ur.Transform(coordTrans)
-        lr.Transform(coordTrans)
-
-        longitudes = [ul.GetX(), ll.GetX(), lr.GetX(), ur.GetX()]
-        latitudes = [ul.GetY(), ll.GetY(), lr.GetY(), ur.GetY()]
-        print("longitudes" + str(longitudes))
-        print("latitudes" + str(latitudes))
-    except:
-        with open(LOG_PATH, 'a+') as logfile:
-            logfile.write('could not get raster projection, assuming WGS84')
-        longitudes = [ulx, llx, lrx, urx]
-        latitudes = [uly, lly, lry, ury]
-
-    data['northlimit'] = uly
-    data['southlimit'] = lly
-    data['eastlimit'] = urx
-    data['westlimit'] = ulx
-    data['latmin'] = min(longitudes)
-    data['latmax'] = max(longitudes)
-    data['lonmin'] = min(latitudes)
-    data['lonmax'] = max(latitudes)
+        longitudes, latitudes = transformOutline(x, y, datasource.GetProjectionRef())
+    except Exception:
+        logger.warning('could not get raster projection, assuming WGS84')
+        longitudes, latitudes = x, y
+
+    data['northlimit'] = float(latitudes.max())
+    data['southlimit'] = float(latitudes.min())
+    data['eastlimit'] = float(longitudes.max())
+    data['westlimit'] = float(longitudes.min())
+    data['lonmin'] = float(longitudes.min())
+    data['lonmax'] = float(longitudes.max())
+    data['latmin'] = float(latitudes.min())
+    data['latmax'] = float(latitudes.max())
 
     # file type
     data['type'] = 'geospatial'
 
     # return commonData(data, filepath)
-    return geoData(data, filepath)
+    return geoData(data, probe.path)
@@ -1,20 +1,21 @@
 from pyhdf.SD import SD, SDC
-from osgeo import ogr, osr, gdal
+from osgeo import ogr, osr
 import sys
-from pyproj import Proj, transform
-import pyproj
 import numpy as np
 import re
+from .. import crs
 
-def getMetadata(filepath):
+SINUSOIDAL = "+proj=sinu +R=6371007.181 +nadgrids=@null +wktext"
+
+def getMetadata(probe):
     metadata = {}
-    hdf_file = SD(filepath, SDC.READ)
-    dataset= gdal.Open(filepath, gdal.GA_ReadOnly)
-   
+    hdf_file = SD(probe.path, SDC.READ)
+
     # Construct the grid.  The needed information is in a global attribute
     # called 'StructMetadata.0'.  Use regular expressions to tease out the
     # extents of the grid.  
     fattrs = hdf_file.attributes(full=1)
+    hdf_file.end()
     ga = fattrs["StructMetadata.0"]
     gridmeta = ga[0]
 
@@ -48,9 +49,8 @@ def getMetadata(filepath):
 
     # support MODIS sinusoidal projection for now, add others later
     if proj == 'GCTP_SNSOID':
-        sinu = pyproj.Proj("+proj=sinu +R=6371007.181 +nadgrids=@null +wktext")
-        wgs84 = pyproj.Proj("+init=EPSG:4326")
-        metadata['lonmin'], metadata['latmin'] = pyproj.transform(sinu, wgs84, x0, y0)
-        metadata['lonmax'], metadata['latmax'] = pyproj.transform(sinu, wgs84, x1, y1)
+        sinu = crs.transformer_to_wgs84(SINUSOIDAL)
+        metadata['lonmin'], metadata['latmin'] = sinu.transform(x0, y0)
+        metadata['lonmax'], metadata['latmax'] = sinu.transform(x1, y1)
 
     return  metadata
@@ -1,37 +1,36 @@
-import json
-
-from osgeo import gdal, ogr
-import netCDF4
 import numpy
 
 
-def getMetadata(filepath):
-    # ------------ NC and TIF --------------------- #
-    raster = gdal.Open(filepath)
-    data = {}
+# the only variable attributes copied into `subdata`; others are never read
+SUBDATA_ATTRIBUTES = ['standard_name', 'long_name', 'description', 'units', 'dimensions']
+
+
+def summarizeVariable(variable):
+    # shape, type, and storage layout, all of which come from the file header
+    chunking = variable.chunking()
+    return {
+        'dimensions': list(variable.dimensions),
+        'shape': list(variable.shape),
+        'dtype': str(variable.dtype),
+        'chunking': chunking if chunking == 'contiguous' else list(chunking),
+    }
 
-    datasource = gdal.Open(filepath)
-    data['xsize'] = datasource.RasterXSize
-    data['ysize'] = datasource.RasterYSize
-    ulx, uly, llx, lly, lrx, lry, urx, ury = getCoverage(datasource)
-    longitudes = [ulx, llx, lrx, urx]
-    latitudes = [uly, lly, lry, ury]
-    data['northlimit'] = uly
-    data['southlimit'] = lly
-    data['eastlimit'] = urx
-    data['westlimit'] = ulx
-    data['latmin'] = min(longitudes)
-    data['latmax'] = max(longitudes)
-    data['lonmin'] = min(latitudes)
-    data['lonmax'] = max(latitudes)
+
+def getMetadata(probe):
+    # the bounds and raster size are filled in by `raster.getMetadata` from the
+    # GDAL dataset; this reads only the netCDF header, through the probe's single
+    # netCDF handle, which the probe closes when extraction is done
+    data = {}
 
     # ------------ NC Specific Metadata ------------ #
-    ncdataset = netCDF4.Dataset(filepath)
+    ncdataset = probe.netcdf_dataset()
+
+    data['dimensions'] = {name: len(dim) for name, dim in ncdataset.dimensions.items()}
 
     # globals
     global_attributes = {}
     for attr in ncdataset.ncattrs():
-        global_attributes[str(attr)] = str(getattr(ncdataset, attr))
+        global_attributes[str(attr)] = str(ncdataset.getncattr(attr))
     if 'title' in global_attributes:
         data['title'] = str(global_attributes['title'])
     if 'history' in global_attributes:
@@ -39,18 +38,23 @@ def getMetadata(filepath):
 
     subdata = {}
     # variables
-    for i, (name, variable) in enumerate(ncdataset.variables.items(), start=1):
+    for i, (var_name, variable) in enumerate(ncdataset.variables.items(), start=1):
+        present = set(variable.ncattrs())
         var = {}
-        for attrname in variable.ncattrs():
-            var[str(attrname)] = convert_type(getattr(variable, attrname))
+        for attrname in SUBDATA_ATTRIBUTES:
+            if attrname in present:
+                var[attrname] = convert_type(variable.getncattr(attrname))
 
-        var_name = 'sub{}'.format(i - 1)  # start index should be 0
+        sub_name = 'sub{}'.format(i - 1)  # start index should be 0
         for name in ['standard_name', 'long_name']:
             if name in var:
-                subdata[var_name] = {'title': var[name]}
+                subdata[sub_name] = {'title': var[name]}
                 for key in ['description', 'units', 'dimensions']:
                     if key in var:
-                        subdata[var_name][key] = var[key]
+                        subdata[sub_name][key] = var[key]
+        if sub_name in subdata:
+            # kept apart, so as not to replace the `dimensions` attribute
+            subdata[sub_name]['summary'] = summarizeVariable(variable)
 
     data['subdata'] = subdata
 
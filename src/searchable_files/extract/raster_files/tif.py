@@ -1,3 +1,7 @@
+import logging
+import math
+
+import numpy as np
 from osgeo import gdal
 
 # --------------- for datasource file ------------------#
@@ -7,13 +11,17 @@ GDALColorInterp = {0: 'Undefined', 1: 'Gray', 2: 'Paletted (see color table)', 3
                    6: 'Alpha', 7: 'Hue', 8: 'Saturation', 9: 'Lightness', 10: 'Cyan', 11: 'Magenta', 12: 'Yellow',
                    13: 'Black', 14: 'Y Luminance', 15: 'Cb Chroma', 16: 'Cr Chroma', 17: 'Max'}
 
-LOG_PATH = '/tmp/messages.txt'
+logger = logging.getLogger(__name__)
+
+# bands larger than this many pixels are summarized approximately, from an
+# overview or from a sample of their blocks, unless exact statistics are asked for
+APPROX_MAX_PIXELS = 1024 * 1024
 
 
-def getMetadata(filepath):
+def getMetadata(probe):
     data = {}
 
-    datasource = gdal.Open(filepath)
+    datasource = probe.gdal_dataset()
 
     try:
         if datasource.RasterXSize is not None:
@@ -22,8 +30,7 @@ def getMetadata(filepath):
             data['ysize'] = datasource.RasterYSize
         ulx, uly, llx, lly, lrx, lry, urx, ury = getCoverage(datasource)
     except:
-        with open(LOG_PATH, 'a+') as logfile:
-            logfile.write('exception occurred getting metadata for tif file')
+        logger.exception('exception occurred getting metadata for tif file')
 
     longitudes = [ulx, llx, lrx, urx]
     latitudes = [uly, lly, lry, ury]
@@ -52,24 +59,25 @@ def getMetadata(filepath):
 
     # get subdata, which in the case of a GeoTiff file could be the color interpretation of each band
     subdata = {}
-    for band_num in range(datasource.RasterCount, 1):
+    # bands are numbered from 1
+    for band_num in range(1, datasource.RasterCount + 1):
         band = datasource.GetRasterBand(band_num)
         band_description = band.GetDescription()
         band_color_interp = band.GetColorInterpretation()
         key = 'sub{}'.format(band_num - 1)  # index should start at 0
         title = 'Band {}'.format(band_num)
 
-        subdata[key] = {}
+        subdata[key] = {'title': title}
         # if there is a user defined description
         if band_description is not None and band_description != '':
-            subdata[key]['title'] = title
             subdata[key]['description'] = band_description
 
         # if there is a valid color interpretation
         if band_color_interp is not None and band_color_interp in range(18):
-            subdata[key]['title'] = title
             subdata[key]['type'] = GDALColorInterp.get(band_color_interp)
 
+        subdata[key].update(bandStatistics(band, exact=probe.exact_stats))
+
     # if there was nonempty subdata, add it to the data dictionary
     if len(subdata) > 0:
         data['subdata'] = subdata
@@ -77,6 +85,93 @@ def getMetadata(filepath):
     return data
 
 
+def bandStatistics(band, exact=False):
+    """
+    min/max/mean of the valid (not nodata, not NaN) pixels of a band, along
+    with its data type and nodata value.
+
+    Unless `exact` is set, a large band is summarized from its largest overview
+    which is small enough, or failing that from an evenly spaced sample of its
+    blocks, so that only a bounded number of pixels is ever read.
+    """
+    nodata = band.GetNoDataValue()
+    source, sampled = band, False
+    if not exact and band.XSize * band.YSize > APPROX_MAX_PIXELS:
+        source = _statisticsOverview(band)
+        sampled = source.XSize * source.YSize > APPROX_MAX_PIXELS
+
+    count, total = 0, 0.0
+    minimum = maximum = None
+    for xoff, yoff, xsize, ysize in _blockWindows(source, sampled):
+        values = source.ReadAsArray(xoff, yoff, xsize, ysize)
+        valid = np.ones(values.shape, dtype=bool)
+        if nodata is not None and not math.isnan(nodata):
+            valid &= values != nodata
+        if values.dtype.kind in 'fc':
+            valid &= ~np.isnan(values)
+        values = values[valid]
+        if not values.size:
+            continue
+        count += values.size
+        total += float(values.sum(dtype=np.float64))
+        block_min, block_max = values.min().item(), values.max().item()
+        minimum = block_min if minimum is None else min(minimum, block_min)
+        maximum = block_max if maximum is None else max(maximum, block_max)
+
+    if nodata is not None and math.isnan(nodata):
+        # NaN has no JSON representation
+        nodata = 'nan'
+    return {
+        'dtype': gdal.GetDataTypeName(band.DataType),
+        'nodata': nodata,
+        'min': minimum,
+        'max': maximum,
+        'mean': total / count if count else None,
+        'statistics': 'exact' if source is band and not sampled else 'approximate',
+    }
+
+
+def _statisticsOverview(band):
+    # overviews are listed from largest to smallest; use the largest one that is
+    # small enough, or else the smallest there is (possibly the band itself)
+    source = band
+    for i in range(band.GetOverviewCount()):
+        overview = band.GetOverview(i)
+        if overview is None:
+            continue
+        source = overview
+        if overview.XSize * overview.YSize <= APPROX_MAX_PIXELS:
+            break
+    return source
+
+
+def _blockWindows(band, sampled):
+    # (xoff, yoff, xsize, ysize) of each natural block of the band, which GDAL
+    # can read without touching its neighbours
+    #
+    # if `sampled`, only an evenly spaced subset of the blocks, totalling about
+    # APPROX_MAX_PIXELS pixels
+    block_xsize, block_ysize = band.GetBlockSize()
+    blocks_per_row = math.ceil(band.XSize / block_xsize)
+    num_blocks = blocks_per_row * math.ceil(band.YSize / block_ysize)
+    indices = range(num_blocks)
+    if sampled:
+        num_samples = max(1, APPROX_MAX_PIXELS // (block_xsize * block_ysize))
+        if num_samples < num_blocks:
+            indices = np.unique(
+                np.linspace(0, num_blocks - 1, num_samples).astype(np.int64)
+            ).tolist()
+    for index in indices:
+        xoff = (index % blocks_per_row) * block_xsize
+        yoff = (index // blocks_per_row) * block_ysize
+        yield (
+            xoff,
+            yoff,
+            min(block_xsize, band.XSize - xoff),
+            min(block_ysize, band.YSize - yoff),
+        )
+
+
 def getCoverage(datasource):
     upx, xres, xskew, upy, yskew, yres = datasource.GetGeoTransform()
     cols = datasource.RasterXSize
@@ -0,0 +1,51 @@
+import importlib
+
+# readers are named rather than imported, so that GDAL, netCDF4, pyhdf, h5py, and
+# pyproj are only loaded once a file which needs them is actually processed
+#
+# extension -> "module:function", relative to this package
+RASTER_HANDLERS = {
+    ".hdf4": "raster:getMetadata",
+    ".hdf": "raster:getMetadata",
+    ".hdf5": "raster:getMetadata",
+    ".nc": "raster:getMetadata",
+    ".tif": "raster:getMetadata",
+}
+VECTOR_HANDLERS = {
+    ".shp": "vector:getMetadata",
+}
+HANDLERS = {**RASTER_HANDLERS, **VECTOR_HANDLERS}
+
+# files which belong to a dataset stored under another file's name, and are read
+# along with it rather than on their own
+#
+# primary extension -> extensions of its sidecar files, sharing the same stem
+SIDECAR_EXTENSIONS = {
+    ".shp": (".shx", ".dbf", ".prj", ".sbn", ".sbx", ".cpg", ".qix", ".shp.xml"),
+}
+
+# the format-specific part of a raster file's metadata
+RASTER_FORMAT_READERS = {
+    ".hdf4": "raster_files.hdf4:getMetadata",
+    ".hdf": "raster_files.hdf4:getMetadata",
+    ".hdf5": "raster_files.hdf5:getMetadata",
+    ".nc": "raster_files.nc:getMetadata",
+    ".tif": "raster_files.tif:getMetadata",
+}
+
+_loaded = {}
+
+
+def resolve(spec):
+    if spec not in _loaded:
+        module_name, function_name = spec.split(":")
+        module = importlib.import_module(f".{module_name}", __package__)
+        _loaded[spec] = getattr(module, function_name)
+    return _loaded[spec]
+
+
+def get_handler(extension, handlers=HANDLERS):
+    spec = handlers.get(extension)
+    if spec is None:
+        return None
+    return resolve(spec)
@@ -0,0 +1,60 @@
+# file formats recognized from the first bytes of a file
+#
+# (format, signature, offsets at which the signature may appear)
+# an HDF5 superblock may follow a user block of 512, 1024, 2048... bytes
+SIGNATURES = [
+    ("netcdf", b"CDF\x01", (0,)),
+    ("netcdf", b"CDF\x02", (0,)),
+    ("netcdf", b"CDF\x05", (0,)),
+    ("hdf5", b"\x89HDF\r\n\x1a\n", (0, 512, 1024, 2048, 4096)),
+    ("hdf4", b"\x0e\x03\x13\x01", (0,)),
+    ("tiff", b"II*\x00", (0,)),
+    ("tiff", b"MM\x00*", (0,)),
+    ("tiff", b"II+\x00", (0,)),  # BigTIFF
+    ("tiff", b"MM\x00+", (0,)),
+    # the main file and the index of a shapefile share this file code
+    ("shapefile", b"\x00\x00\x27\x0a", (0,)),
+    ("zip", b"PK\x03\x04", (0,)),
+    ("zip", b"PK\x05\x06", (0,)),
+]
+
+# the formats each extension may legitimately contain; other extensions (like
+# '.h5' or '.tiff') are routed to a handler by content
+# netCDF-4 files are HDF5 files underneath
+EXTENSION_FORMATS = {
+    ".nc": {"netcdf", "hdf5"},
+    ".hdf5": {"hdf5"},
+    ".hdf": {"hdf4"},
+    ".hdf4": {"hdf4"},
+    ".tif": {"tiff"},
+    ".shp": {"shapefile"},
+    ".shx": {"shapefile"},
+    ".zip": {"zip"},
+}
+
+# the extension whose handler reads each format, when the file's own extension
+# is missing or wrong
+# shapefiles are not listed: OGR can only open one under its proper name
+FORMAT_EXTENSIONS = {
+    "netcdf": ".nc",
+    "hdf5": ".hdf5",
+    "hdf4": ".hdf",
+    "tiff": ".tif",
+}
+
+
+def sniff_format(head):
+    for fmt, signature, offsets in SIGNATURES:
+        for offset in offsets:
+            if head[offset : offset + len(signature)] == signature:
+                return fmt
+    return None
+
+
+def dispatch_extension(extension, fmt):
+    # the extension is trusted when it agrees with the content, or when the
+    # content is not recognized (text formats like KML and GML have no signature)
+    extension = extension.lower()
+    if fmt is None or fmt in EXTENSION_FORMATS.get(extension, ()):
+        return extension
+    return FORMAT_EXTENSIONS.get(fmt, extension)
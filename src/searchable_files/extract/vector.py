@@ -1,52 +1,68 @@
-from pyproj import Proj, transform
-from osgeo import ogr
+import logging
+
+from ..lib.timing import span
+from . import crs
+from . import registry
+from . import vector_stats
 from .common import commonData
 from .common import geoData
 from .vector_files import gml
 from .vector_files import kml
 from .vector_files import shp
-import os.path
 
 # extensions = ['.gml', '.kml', '.shp', '.dbf', '.prj', '.shx']
-extensions = ['.shp']
+extensions = list(registry.VECTOR_HANDLERS)
 shapefile_components = ['.shp', '.dbf', '.prj', '.shx']
 
+logger = logging.getLogger(__name__)
+
 
 # ------------ for vector file------------------#
 
 def transformCoordinates(x1, y1, inProj_epsg):
-    inProj = Proj(init='epsg:' + inProj_epsg)
-    outProj = Proj(init='epsg:4326')
-    x2, y2 = transform(inProj, outProj, x1, y1)
-    return x2, y2
+    with span("reproject"):
+        return crs.epsg_transformer_to_wgs84(inProj_epsg).transform(x1, y1)
 
 
 def shapefileComplete(filepath):
     return shp.shapefileComplete(filepath)
 
 
-def getMetadata(filepath):
+def getMetadata(probe):
     # get datasource
-    driver = None
-    filename, ext = os.path.splitext(filepath)
+    driver_name = None
+    ext = probe.dispatch_extension
     if (ext == '.gml'):
-        driver = ogr.GetDriverByName('GML')
+        driver_name = 'GML'
     elif (ext == '.kml'):
-        driver = ogr.GetDriverByName('KML')
+        driver_name = 'KML'
     elif (ext == '.shp'):
-        driver = ogr.GetDriverByName('ESRI Shapefile')
+        driver_name = 'ESRI Shapefile'
 
-    with open('/tmp/messages.txt', 'a+') as logfile:
-        logfile.write('\n get shp metadata %s' % filepath)
-    datasource = driver.Open(filepath)
-    with open('/tmp/messages.txt', 'a+') as logfile:
-        logfile.write('\n opened shapefile')
+    logger.info('get shp metadata %s', probe.path)
+    datasource = probe.ogr_dataset(driver_name)
+    logger.info('opened shapefile')
     data = {}
 
-    # get extent
     layer = datasource.GetLayer()
-    extent = layer.GetExtent()
     print("layer" + str(layer))
+
+    # formats with an extent in their header (like shapefiles) report it for
+    # free, and most know their feature count; reading every feature is only
+    # worth it when asked for
+    extent = layer.GetExtent(force=0, can_return_null=True)
+    if probe.scan_features:
+        stats = vector_stats.layer_stats(layer, need_extent=extent is None)
+        data.update(stats.as_dict())
+        if extent is None:
+            extent = stats.extent
+    else:
+        feature_count = layer.GetFeatureCount(force=0)
+        if feature_count >= 0:
+            data['featureCount'] = feature_count
+    if extent is None:
+        # GDAL reads the geometries (in C) for the extent
+        extent = layer.GetExtent(can_return_null=True)
     if extent is not None:
         data['westlimit'] = extent[0]
         data['eastlimit'] = extent[1]
@@ -55,7 +71,7 @@ def getMetadata(filepath):
 
     # get projection
     spatialref = layer.GetSpatialRef()
-    if spatialref is not None:
+    if spatialref is not None and extent is not None:
         inProj_epsg = spatialref.GetAttrValue('AUTHORITY', 1)
         data['lonmin'], data['latmin'] = transformCoordinates(extent[0], extent[2], str(inProj_epsg))
         data['lonmax'], data['latmax'] = transformCoordinates(extent[1], extent[3], str(inProj_epsg))
@@ -74,4 +90,4 @@ def getMetadata(filepath):
     data['type'] = 'geospatial'
 
     # return commonData(data, filepath)
-    return geoData(data, filepath)
+    return geoData(data, probe.path)
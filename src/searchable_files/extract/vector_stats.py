@@ -0,0 +1,219 @@
+import collections
+import itertools
+
+import numpy as np
+
+try:
+    import shapely
+except ImportError:
+    shapely = None
+
+# features per batch; memory use depends on this, not on the size of the layer
+BATCH_SIZE = 65536
+
+# base geometry types of (ISO or extended) WKB
+WKB_GEOMETRY_NAMES = {
+    0: "Geometry",
+    1: "Point",
+    2: "LineString",
+    3: "Polygon",
+    4: "MultiPoint",
+    5: "MultiLineString",
+    6: "MultiPolygon",
+    7: "GeometryCollection",
+}
+# flags used by extended (PostGIS-style) WKB instead of ISO's +1000/+2000/+3000
+EWKB_Z = 0x80000000
+EWKB_M = 0x40000000
+EWKB_SRID = 0x20000000
+
+
+class LayerStats:
+    """
+    Summary statistics of a vector layer, accumulated one batch of features at
+    a time: feature count, extent, a histogram of geometry types, and the number
+    of null values in each attribute field.
+    """
+
+    def __init__(self, field_names, need_extent=True):
+        self.feature_count = 0
+        self.geometry_types = collections.Counter()
+        self.null_counts = dict.fromkeys(field_names, 0)
+        # (minx, maxx, miny, maxy), in the order of `Layer.GetExtent()`; left
+        # as None if not needed, or if it could not be worked out from the
+        # batches alone
+        self.need_extent = need_extent
+        self.extent = None
+        self._extent_complete = True
+
+    def add_batch(self, num_features, geometries, fields):
+        # `geometries` is an array of WKB bytes (None for a null geometry), and
+        # `fields` maps each field name to an array of its values
+        self.feature_count += num_features
+        for name, values in fields.items():
+            if name in self.null_counts:
+                self.null_counts[name] += _null_count(values)
+        if geometries is None:
+            return
+
+        if np.ma.isMaskedArray(geometries):
+            geometries = np.where(np.ma.getmaskarray(geometries), None, geometries.data)
+        geometries = np.asarray(geometries, dtype=object)
+        present = ~np.equal(geometries, None)
+        num_null = int(np.count_nonzero(~present))
+        if num_null:
+            self.geometry_types["None"] += num_null
+        wkbs = geometries[present]
+        if not len(wkbs):
+            return
+        codes = _wkb_type_codes(wkbs)
+        unique_codes, counts = np.unique(codes, return_counts=True)
+        for code, count in zip(unique_codes, counts):
+            self.geometry_types[_geometry_name(int(code))] += int(count)
+        if self.need_extent and self._extent_complete:
+            self._add_envelopes(wkbs, codes)
+
+    def _add_envelopes(self, wkbs, codes):
+        # points (by far the most common geometry in large layers) are read
+        # straight from the WKB; anything else is parsed in bulk by shapely,
+        # and without it the extent is left to `Layer.GetExtent()`
+        is_point = ((codes & 0x0FFFFFFF) % 1000 == 1) & ((codes & EWKB_SRID) == 0)
+        envelopes = []
+        if is_point.any():
+            envelope = _point_envelope(wkbs[is_point])
+            if envelope is not None:
+                envelopes.append(envelope)
+        if not is_point.all():
+            if shapely is None:
+                self._extent_complete = False
+                self.extent = None
+                return
+            envelope = _geometry_envelope(wkbs[~is_point])
+            if envelope is not None:
+                envelopes.append(envelope)
+        if not envelopes:
+            return
+
+        if self.extent is not None:
+            envelopes.append(np.array(self.extent))
+        envelopes = np.vstack(envelopes)
+        self.extent = (
+            float(envelopes[:, 0].min()),
+            float(envelopes[:, 1].max()),
+            float(envelopes[:, 2].min()),
+            float(envelopes[:, 3].max()),
+        )
+
+    def as_dict(self):
+        return {
+            "featureCount": self.feature_count,
+            "geometryTypes": dict(self.geometry_types),
+            "fieldNullCounts": self.null_counts,
+        }
+
+
+def _null_count(values):
+    if np.ma.isMaskedArray(values):
+        return int(np.ma.count_masked(values))
+    if values.dtype == object:
+        return int(np.count_nonzero(np.equal(values, None)))
+    return 0
+
+
+def _wkb_type_codes(wkbs):
+    # the geometry type of each WKB value, from its 5-byte header:
+    # a byte order flag, then a uint32 type code in that byte order
+    header = np.frombuffer(b"".join(bytes(w[:5]) for w in wkbs), dtype=np.uint8)
+    header = header.reshape(-1, 5)
+    type_bytes = np.ascontiguousarray(header[:, 1:5])
+    little = type_bytes.view("<u4").ravel().astype(np.int64)
+    big = type_bytes.view(">u4").ravel().astype(np.int64)
+    return np.where(header[:, 0] == 1, little, big)
+
+
+def _geometry_name(code):
+    iso_dimension = (code & 0x0FFFFFFF) // 1000
+    has_z = bool(code & EWKB_Z) or iso_dimension in (1, 3)
+    has_m = bool(code & EWKB_M) or iso_dimension in (2, 3)
+    name = WKB_GEOMETRY_NAMES.get((code & 0x0FFFFFFF) % 1000, "Unknown")
+    if has_z or has_m:
+        name += " " + ("Z" if has_z else "") + ("M" if has_m else "")
+    return name
+
+
+def _point_envelope(wkbs):
+    # x and y follow the header of every point, whatever its dimensions; an
+    # empty point is stored as NaN coordinates
+    raw = np.frombuffer(b"".join(bytes(w[:21]) for w in wkbs), dtype=np.uint8)
+    raw = raw.reshape(-1, 21)
+    coordinates = np.ascontiguousarray(raw[:, 5:21])
+    little = coordinates.view("<f8")
+    big = coordinates.view(">f8").astype("<f8")
+    xy = np.where((raw[:, 0] == 1)[:, None], little, big)
+    xy = xy[~np.isnan(xy).any(axis=1)]
+    if not len(xy):
+        return None
+    return np.array([xy[:, 0].min(), xy[:, 0].max(), xy[:, 1].min(), xy[:, 1].max()])
+
+
+def _geometry_envelope(wkbs):
+    # shapely's bounds are (minx, miny, maxx, maxy), and NaN for empty geometries
+    bounds = shapely.bounds(shapely.from_wkb([bytes(w) for w in wkbs]))
+    bounds = bounds[~np.isnan(bounds).any(axis=1)]
+    if not len(bounds):
+        return None
+    return np.array(
+        [bounds[:, 0].min(), bounds[:, 2].max(), bounds[:, 1].min(), bounds[:, 3].max()]
+    )
+
+
+def _arrow_batches(layer):
+    # GDAL >= 3.6 hands out features column by column, in Arrow record batches,
+    # without building an OGRFeature for each of them
+    stream = layer.GetArrowStreamAsNumPy(
+        [f"MAX_FEATURES_IN_BATCH={BATCH_SIZE}", "USE_MASKED_ARRAYS=YES"]
+    )
+    geometry_column = layer.GetGeometryColumn() or "wkb_geometry"
+    for batch in stream:
+        num_features = len(next(iter(batch.values()))) if batch else 0
+        yield num_features, batch.get(geometry_column), batch
+
+
+def _feature_batches(layer, field_names):
+    # the same batches, built one feature at a time, for older GDAL versions
+    # iterating a layer starts over from its first feature, so only do it once
+    all_features = iter(layer)
+    while True:
+        features = list(itertools.islice(all_features, BATCH_SIZE))
+        if not features:
+            return
+        geometries = np.empty(len(features), dtype=object)
+        for i, feature in enumerate(features):
+            geometry = feature.GetGeometryRef()
+            if geometry is not None:
+                geometries[i] = geometry.ExportToIsoWkb()
+        fields = {}
+        for name in field_names:
+            values = np.empty(len(features), dtype=object)
+            for i, feature in enumerate(features):
+                if feature.IsFieldSetAndNotNull(name):
+                    values[i] = feature.GetField(name)
+            fields[name] = values
+        yield len(features), geometries, fields
+
+
+def layer_stats(layer, need_extent=True):
+    # read every feature of the layer once, in batches; without `need_extent`
+    # (the extent is already known) the geometries are only typed, not measured
+    layerdef = layer.GetLayerDefn()
+    field_names = [
+        layerdef.GetFieldDefn(n).GetName() for n in range(layerdef.GetFieldCount())
+    ]
+    stats = LayerStats(field_names, need_extent)
+    if hasattr(layer, "GetArrowStreamAsNumPy"):
+        batches = _arrow_batches(layer)
+    else:
+        batches = _feature_batches(layer, field_names)
+    for num_features, geometries, fields in batches:
+        stats.add_batch(num_features, geometries, fields)
+    return stats
@@ -1,33 +1,44 @@
-import datetime
-import fnmatch
+import collections
+import functools
 import hashlib
 import json
+import operator
 import os
 import re
 import shutil
 import uuid
 
 import click
-import ruamel.yaml
-from identify import identify
 
 from .extract.converter import idata2schemaorg, RESOURCE_URL_PREFIX
 from .extract.extract_metadata import extract_metadata
-from .lib import all_filenames, common_options, prettyprint_json
-
-yaml = ruamel.yaml.YAML(typ="safe")
+from .extract.grouping import group_datasets, sidecars_of
+from .extract.probe import EDGE_POINTS, FileProbe
+from .lib import (
+    common_options,
+    imap_ordered,
+    jsonio,
+    profile_option,
+    resolve_jobs,
+    walk,
+)
+from .lib.config import load_settings
+from .lib.globs import GlobSet
+from .lib.manifest import ExtractionManifest, manifest_path_for
+from .lib.store import LAYOUTS, detect_layout, open_store, record_key
+from .lib.timing import span
 
 
-def file_tags(filename):
-    return list(identify.tags_from_path(filename))
+def file_tags(probe):
+    return sorted(probe.tags)
 
 
-def stat_dict(filename):
-    info = os.stat(filename)
+def stat_dict(probe):
+    info = probe.info
     return {
         "mode": oct(info.st_mode),
         "size_bytes": info.st_size,
-        "mtime": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(),
+        "mtime": probe.mtime,
     }
 
 
@@ -37,21 +48,18 @@ def extension(filename):
     return None
 
 
-def read_head(filename, settings):
-    match = False
-    for pattern in settings.read_head["files"]:
-        if fnmatch.fnmatch(filename, pattern):
-            match = True
-
-    if not match:
+def read_head(probe, settings):
+    if not settings.read_head_globs.match(probe.path):
+        return None
+    # a binary file has no meaningful preview, even if its name matched
+    if "binary" in probe.tags:
         return None
 
-    # read 2x the desired length of data (to handle preamble matches below)
+    # take 2x the desired length of data (to handle preamble matches below)
     #
-    # note that this is not necessarily 'head_length' bytes
-    # e.g. if the file is encoded in utf-8, 1 character can be up to 4 bytes
-    with open(filename) as fp:
-        data = fp.read(settings.head_length * 2)
+    # the probe reads bytes, not characters: it is sized so that
+    # 2 * 'head_length' characters fit even if each one is 4 bytes of utf-8
+    data = probe.head_text(settings.head_length * 2)
     # once the data is read, check it against any skip_preamble_patterns to see
     # if there is a match
     # and if so, take data starting after that match
@@ -63,45 +71,104 @@ def read_head(filename, settings):
     return data[: settings.head_length]
 
 
-def get_basic_info(filename, settings):
-    info = os.stat(filename)
-
+def get_basic_info(probe, head):
     return {
-        "tags": file_tags(filename),
-        "extension": extension(filename),
-        "name": os.path.basename(filename),
-        "identifier": os.path.basename(filename),
-        "title": os.path.basename(filename),
-        "dateCreated": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(),
-        "dateModified": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(),
-        "description": read_head(filename, settings),
+        "tags": file_tags(probe),
+        "extension": extension(probe.path),
+        "name": probe.basename,
+        "identifier": probe.basename,
+        "title": probe.basename,
+        "dateCreated": probe.mtime,
+        "dateModified": probe.mtime,
+        "description": head,
     }
 
 
-def filename2dict(file_uuid, filename, settings):
+def open_probe(filename, settings, info=None):
+    return FileProbe(
+        filename,
+        info,
+        head_size=settings.head_length * 2 * 4,
+        exact_stats=settings.exact_raster_stats,
+        scan_features=settings.scan_vector_features,
+        edge_points=settings.raster_edge_points,
+    )
+
+
+def all_datasets(directory, include=None, **walk_options):
+    # like `lib.walk`, but a shapefile's .shx, .dbf, .prj etc. come along with
+    # its .shp instead of being listed as files of their own
+    # yields (entry, [sidecar entries])
+    #
+    # `include` selects datasets by their primary file, so that "*.shp" still
+    # brings the sidecars along
+    entries = walk(directory, **walk_options)
+    datasets = group_datasets(entries, key=operator.attrgetter("path"))
+    if not include:
+        return datasets
+    include = GlobSet(include)
+    return (
+        (entry, sidecars)
+        for entry, sidecars in datasets
+        if include.match(entry.relpath)
+    )
+
+
+# the stat fields the manifest compares, for a file and its sidecars taken
+# together, so that editing only the .dbf of a shapefile still invalidates it
+DatasetInfo = collections.namedtuple("DatasetInfo", ["st_size", "st_mtime_ns", "st_ino"])
+
+
+def dataset_info(info, sidecar_infos):
+    if not sidecar_infos:
+        return info
+    return DatasetInfo(
+        info.st_size + sum(s.st_size for s in sidecar_infos),
+        max([info.st_mtime_ns] + [s.st_mtime_ns for s in sidecar_infos]),
+        info.st_ino,
+    )
+
+
+def filename2dict(file_uuid, filename, settings, info=None, sidecars=()):
     print("\n===========\nfilename: " + filename)
-    info = os.stat(filename)
     if file_uuid is None:
         file_uuid = str(uuid.uuid4())
-    schemaorg_json_obj = metadata2schemaorg(filename, file_uuid, settings)
-    # schemaorg_json_obj_static = metadata2schemaorg_static(filename, settings)
-    return {
-        "relpath": filename,
-        **stat_dict(filename),
-        "head": read_head(filename, settings),
-        "tags": file_tags(filename),
-        "extension": extension(filename),
-        "name": os.path.basename(filename),
-        "identifier": file_uuid,
-        "title": os.path.basename(filename),
-        "dateCreated": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(),
-        "dateModified": datetime.datetime.fromtimestamp(info.st_mtime).isoformat(),
-        "description": read_head(filename, settings),
-        "basicInfo": get_basic_info(filename, settings),
-        "subject": file_uuid,
-        # schemaorg json
-        "schemaorgJson": schemaorg_json_obj,
-    }
+    with open_probe(filename, settings, info) as probe:
+        schemaorg_json_obj = metadata2schemaorg(probe, file_uuid, settings)
+        # schemaorg_json_obj_static = metadata2schemaorg_static(filename, settings)
+        head = read_head(probe, settings)
+        return {
+            "relpath": filename,
+            **stat_dict(probe),
+            "head": head,
+            "tags": file_tags(probe),
+            "extension": extension(filename),
+            "name": probe.basename,
+            "identifier": file_uuid,
+            "title": probe.basename,
+            "dateCreated": probe.mtime,
+            "dateModified": probe.mtime,
+            "description": head,
+            "basicInfo": get_basic_info(probe, head),
+            "subject": file_uuid,
+            # the other files of a multi-file dataset, read along with this one
+            "sidecars": list(sidecars),
+            # schemaorg json
+            "schemaorgJson": schemaorg_json_obj,
+        }
+
+
+def cached_filename2dict(manifest, file_uuid, filename, settings, sidecars=()):
+    # reuse the previously extracted document if the file has not changed since
+    if manifest is None:
+        return filename2dict(file_uuid, filename, settings, sidecars=sidecars)
+    info = os.stat(filename)
+    key_info = dataset_info(info, [os.stat(s) for s in sidecars])
+    data = manifest.lookup(filename, key_info, file_uuid)
+    if data is None:
+        data = filename2dict(file_uuid, filename, settings, info, sidecars)
+        manifest.store(filename, key_info, data, file_uuid)
+    return data
 
 
 def multiplefile2dict(file_uuid, path, settings):
@@ -118,8 +185,11 @@ def multiplefile2dict(file_uuid, path, settings):
     merged_schemaorg = None
     merged_has_part = []
     # in all_filenames("single_files")
-    for filename in all_filenames("."):
-        rendered_data[filename] = filename2dict(file_uuid, filename, settings)
+    for entry, sidecars in all_datasets("."):
+        filename = entry.path
+        rendered_data[filename] = filename2dict(
+            file_uuid, filename, settings, entry.info, [s.path for s in sidecars]
+        )
         if merged_data is None:
             merged_data = rendered_data[filename]
         if "schemaorgJson" in merged_data:
@@ -151,26 +221,82 @@ def get_sub_data(schemaorg_data):
     }
 
 
-def metadata2schemaorg(filename, file_uuid, settings):
-    metadata = extract_metadata(filename)
-    print(json.dumps(metadata))
+def metadata2schemaorg(probe, file_uuid, settings):
+    metadata = extract_metadata(probe)
+
+    with span("schemaorg"):
+        return idata2schemaorg(probe, metadata, file_uuid, settings)
+
 
-    return idata2schemaorg(filename, metadata, file_uuid, settings)
+def _extract_one(item, settings):
+    # worker entry point for `extract --jobs`
+    # a failure on one file is reported back rather than raised, so that one bad
+    # input does not take down the whole run
+    filename, info, sidecars = item
+    try:
+        data = filename2dict(None, filename, settings, info, sidecars)
+        return filename, data, None
+    except Exception as err:
+        return filename, None, f"{type(err).__name__}: {err}"
+
+
+# number of files handed to a worker at a time
+# small, because per-file cost varies a lot between formats
+EXTRACT_CHUNKSIZE = 4
 
 
 def target_file(output_directory, filename):
-    hashed_name = hashlib.sha256(filename.encode("utf-8")).hexdigest()
+    # where the flat layout puts the document for `filename`
     os.makedirs(output_directory, exist_ok=True)
-    return os.path.join(output_directory, hashed_name) + ".json"
+    return os.path.join(output_directory, record_key(filename)) + ".json"
+
+
+# an extracted document is a single record, so NDJSON is not offered here
+DOCUMENT_FORMATS = ("pretty", "compact")
+
+
+def write_document(target, data, output_format="pretty"):
+    with span("serialize"):
+        jsonio.write(target, data, output_format)
+
+
+def store_document(store, filename, data):
+    with span("serialize"):
+        store.put(filename, data)
+
+
+# bump whenever a change to the extractor changes the documents it writes, so
+# that documents cached in the manifest are extracted again
+EXTRACTOR_VERSION = 1
+
+# settings which say where files are, rather than what goes into a document
+LOCATION_SETTINGS = ("source_path", "output_path", "manifest_path")
+
+
+def settings_fingerprint(settingsdict):
+    # what a cached document depends on, besides the file itself
+    relevant = {k: v for k, v in settingsdict.items() if k not in LOCATION_SETTINGS}
+    encoded = json.dumps([EXTRACTOR_VERSION, relevant], sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
 
 
 class Settings:
     def __init__(self, settingsdict):
+        self.fingerprint = settings_fingerprint(settingsdict)
         self.read_head = settingsdict.get("read_head", {})
         self.source_path = settingsdict.get("source_path", {})
         self.output_path = settingsdict.get("output_path", {})
+        self.manifest_path = settingsdict.get("manifest_path")
+        self.exact_raster_stats = settingsdict.get("raster_stats") == "exact"
+        self.scan_vector_features = settingsdict.get("vector_stats") == "scan"
+        self.raster_edge_points = int(
+            settingsdict.get("raster_edge_points", EDGE_POINTS)
+        )
+        if self.raster_edge_points < 2:
+            raise ValueError("raster_edge_points must be at least 2 (the corners)")
         if "files" not in self.read_head:
             self.read_head["files"] = []
+        self.read_head_globs = GlobSet(self.read_head["files"])
         self.head_length = int(self.read_head["length"])
         patterns = self.read_head.get("skip_preamble_patterns", [])
         self.skip_preamble_patterns = [re.compile(p) for p in patterns]
@@ -179,8 +305,7 @@ class Settings:
 def _load_settings_callback(ctx, param, value):
     if value is not None:
         print(f'fp = {value}', value)
-        with open(value) as fp:
-            return Settings(yaml.load(fp))
+        return load_settings(value, Settings)
 
 
 @click.command(
@@ -217,32 +342,175 @@ def _load_settings_callback(ctx, param, value):
     callback=_load_settings_callback,
     help="YAML file with configuration for the extractor",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    default=1,
+    show_default=True,
+    type=int,
+    help="Number of worker processes to extract with. "
+         "Use 0 to start one worker per CPU core",
+)
+@click.option(
+    "--manifest",
+    default=None,
+    help="SQLite file recording previously extracted files. "
+         "Defaults to a file next to the output directory",
+)
+@click.option(
+    "--no-cache",
+    default=False,
+    is_flag=True,
+    help="Re-extract every file, even if it is unchanged since the last run",
+)
+@click.option(
+    "--include",
+    multiple=True,
+    help="Only extract files whose path (relative to --directory) matches this "
+         "glob. May be given more than once",
+)
+@click.option(
+    "--exclude",
+    multiple=True,
+    help="Skip files and directories whose path (relative to --directory) "
+         "matches this glob. May be given more than once",
+)
+@click.option(
+    "--max-depth",
+    default=None,
+    type=int,
+    help="How many levels of subdirectories to descend into. "
+         "0 only extracts the files directly in --directory",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(DOCUMENT_FORMATS),
+    default="pretty",
+    show_default=True,
+    help="Write each document as indented JSON, or as single-line JSON",
+)
+@click.option(
+    "--layout",
+    type=click.Choice(LAYOUTS),
+    default="flat",
+    show_default=True,
+    help="Write one file per document in the output directory (flat), spread "
+         "them over subdirectories (sharded), or append them to NDJSON segment "
+         "files with an index (segments)",
+)
+@profile_option
 @common_options
-def extract_cli(settings, directory, output, clean):
+def extract_cli(
+    settings, directory, output, clean, jobs, manifest, no_cache,
+    include, exclude, max_depth, output_format, layout,
+):
     if clean:
         shutil.rmtree(output, ignore_errors=True)
 
+    # documents in another layout would be left behind, and `assemble` would
+    # read those instead of (or along with) the new ones
+    existing_layout = detect_layout(output)
+    if existing_layout not in (None, layout):
+        raise click.UsageError(
+            f"{output} already holds documents in the '{existing_layout}' layout; "
+            f"pass --clean to replace them with the '{layout}' layout"
+        )
+
+    extraction_manifest = None
+    if not no_cache:
+        extraction_manifest = ExtractionManifest(
+            os.path.abspath(manifest or manifest_path_for(output)),
+            fingerprint=settings.fingerprint,
+        )
+        # the manifest would otherwise put the old documents straight back
+        if clean:
+            extraction_manifest.clear()
+
+    # documents are written from inside `directory`
+    os.makedirs(output, exist_ok=True)
+    store = open_store(os.path.abspath(output), layout, output_format)
     old_cwd = os.getcwd()
     os.chdir(directory)
 
-    rendered_data = {}
-    # in all_filenames("single_files")
-    for filename in all_filenames("."):
-        # name, ext = os.path.splitext(filename)
-        # print(name + ", " + ext + ".")
+    num_unchanged = 0
+    changed_stats = {}
+    failures = []
+    # every file the walk found, extracted or not
+    seen = []
 
-        rendered_data[filename] = filename2dict(None, filename, settings)
+    # unchanged files are served from the manifest here, in the main process,
+    # and only the remainder is handed to the workers
+    #
+    # the stat result from the walk is passed along so that nobody stats again
+    def changed_files():
+        nonlocal num_unchanged
+        datasets = all_datasets(
+            ".", include=include, exclude=exclude, max_depth=max_depth
+        )
+        for entry, sidecar_entries in datasets:
+            filename, info = entry.path, entry.info
+            seen.append(filename)
+            sidecars = [s.path for s in sidecar_entries]
+            if extraction_manifest is not None:
+                key_info = dataset_info(info, [s.info for s in sidecar_entries])
+                data = extraction_manifest.lookup(filename, key_info)
+                if data is not None:
+                    num_unchanged += 1
+                    # output for unchanged files is usually still in place from
+                    # the previous run
+                    if not store.contains(filename):
+                        store_document(store, filename, data)
+                    continue
+                changed_stats[filename] = key_info
+            yield filename, info, sidecars
+
+    # in all_filenames("single_files")
+    #
+    # each document is written as soon as it arrives, so memory use depends only
+    # on the number of files in flight, and a crash keeps everything written so far
+    results = imap_ordered(
+        functools.partial(_extract_one, settings=settings),
+        changed_files(),
+        jobs=resolve_jobs(jobs),
+        chunksize=EXTRACT_CHUNKSIZE,
+    )
+    try:
+        for filename, data, err in results:
+            info = changed_stats.pop(filename, None)
+            if err is not None:
+                failures.append((filename, err))
+                continue
+            store_document(store, filename, data)
+            if extraction_manifest is not None:
+                extraction_manifest.store(filename, info, data)
+
+        # documents of files which have been removed from `directory` would
+        # otherwise be assembled (and submitted) again forever; only a walk of
+        # the whole tree can tell which files are gone
+        num_pruned = 0
+        if not (include or exclude or max_depth is not None):
+            num_pruned = store.prune(seen)
+            if extraction_manifest is not None:
+                extraction_manifest.prune(seen)
+    finally:
+        store.close()
+        if extraction_manifest is not None:
+            extraction_manifest.close()
+        os.chdir(old_cwd)
 
     # in all_filenames("multiple_files")
     # generate schemaorg for each file
     # generate schemaorg for the zip file
     # add schemaorg of each file to the 'hasPart' field in the schemaorg of the zip file
 
-    os.chdir(old_cwd)
-    for filename, data in rendered_data.items():
-        with open(target_file(output, filename), "w") as fp:
-            prettyprint_json(data, fp)
-
+    click.echo(f"{num_unchanged} unchanged files reused from the manifest")
+    if num_pruned:
+        click.echo(f"{num_pruned} documents of removed files deleted")
+    for filename, err in failures:
+        click.echo(f"failed to extract {filename}: {err}", err=True)
+    if failures:
+        click.echo(f"{len(failures)} files could not be extracted", err=True)
     click.echo("metadata extraction complete")
     click.echo(f"results visible in\n  {output}")
 
@@ -250,33 +518,54 @@ def extract_cli(settings, directory, output, clean):
 SETTING_PATH = "data/config/extractor.yaml"
 
 
+def _handler_manifest(settings):
+    # the worker keeps one manifest connection open for the life of the process
+    path = settings.manifest_path or manifest_path_for(settings.output_path)
+    if getattr(_handler_manifest, "path", None) != path:
+        _handler_manifest.path = path
+        # several worker processes share the manifest, so each document is
+        # committed as soon as it is stored, to keep write transactions (and the
+        # lock they hold) short
+        _handler_manifest.instance = ExtractionManifest(path, commit_interval=1)
+    # the settings are reloaded when their file changes
+    _handler_manifest.instance.fingerprint = settings.fingerprint
+    return _handler_manifest.instance
+
+
+def iter_handler_documents(uuid, path, file_type, settings):
+    # yields (path, document) pairs for one worker message, one file at a time
+    manifest = _handler_manifest(settings)
+    try:
+        if file_type == "single":
+            sidecars = sidecars_of(path)
+            yield path, cached_filename2dict(manifest, uuid, path, settings, sidecars)
+        elif file_type == "multiple":
+            yield path, multiplefile2dict(uuid, path, settings)
+        elif file_type == "list":
+            # grouping only looks at neighbouring paths, and the caller's list
+            # need not keep a directory's files together; the sort is stable,
+            # so each directory keeps the caller's order
+            path_list = sorted(path, key=os.path.dirname)
+            for p, sidecars in group_datasets(path_list):
+                yield p, cached_filename2dict(manifest, uuid, p, settings, sidecars)
+    finally:
+        manifest.commit()
+
+
 def extract_handler(uuid, path, clean, file_type):
-    settings = Settings(yaml.load(open(SETTING_PATH)))
+    settings = load_settings(SETTING_PATH, Settings)
     output = settings.output_path
 
     if clean:
         shutil.rmtree(output, ignore_errors=True)
+        _handler_manifest(settings).clear()
 
-    old_cwd = os.getcwd()
     # os.chdir(directory)
     print(f"[extract_handler] settings={settings}")
 
-    rendered_data = {}
     # in all_filenames("single_files")
-
-    if file_type == "single":
-        rendered_data[path] = filename2dict(uuid, path, settings)
-    elif file_type == "multiple":
-        rendered_data[path] = multiplefile2dict(uuid, path, settings)
-    elif file_type == "list":
-        path_list = path
-        for p in path_list:
-            rendered_data[path] = filename2dict(uuid, p, settings)
-
-    os.chdir(old_cwd)
-    for filename, data in rendered_data.items():
-        with open(target_file(output, filename), "w") as fp:
-            prettyprint_json(data, fp)
+    for filename, data in iter_handler_documents(uuid, path, file_type, settings):
+        write_document(target_file(output, filename), data)
 
     click.echo("metadata extraction complete")
     click.echo(f"results visible in\n  {output}")
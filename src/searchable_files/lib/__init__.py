@@ -3,8 +3,11 @@ import os
 
 import click
 
+from . import timing
 from .auth import auth_client, internal_auth_client, token_storage_adapter
-from .search import search_client
+from .parallel import imap_ordered, imap_threaded, resolve_jobs
+from .search import SEARCH_BACKEND_ENV, parse_search_backend, search_client
+from .walk import WalkEntry, walk
 
 APP_SCOPES = ["openid", "profile", "urn:globus:auth:scope:search.api.globus.org:all"]
 
@@ -14,11 +17,55 @@ def common_options(f):
     return click.help_option("-h", "--help")(f)
 
 
-def all_filenames(directory):
-    for dirpath, _dirnames, filenames in os.walk(directory):
-        for f in filenames:
-            if not f.endswith(".DS_Store"):
-                yield os.path.relpath(os.path.join(dirpath, f))
+def _profile_callback(ctx, param, value):
+    if value is not None:
+        timing.enable()
+        # resolved now, since commands may change directory while they run
+        path = os.path.abspath(value)
+        ctx.call_on_close(lambda: timing.write_profile(path))
+
+
+def _search_backend_callback(ctx, param, value):
+    if value is not None:
+        parse_search_backend(value)
+        # in the environment, for the worker processes of the command too
+        os.environ[SEARCH_BACKEND_ENV] = value
+
+
+def search_backend_option(f):
+    # `--search-backend fake[:options]` swaps the Globus Search service for a
+    # local stand-in, see `lib.fake_search`
+    return click.option(
+        "--search-backend",
+        default=None,
+        metavar="SPEC",
+        envvar=SEARCH_BACKEND_ENV,
+        expose_value=False,
+        is_eager=True,
+        callback=_search_backend_callback,
+        help="'globus' (the default), or 'fake' for a local stand-in for "
+        "Globus Search, optionally followed by options such as "
+        "'fake:latency=0.05,failure_rate=0.01,task_seconds=2'",
+    )(f)
+
+
+def profile_option(f):
+    # `--profile PATH` times each stage of the command and writes the spans to
+    # PATH when it finishes
+    return click.option(
+        "--profile",
+        default=None,
+        metavar="PATH",
+        expose_value=False,
+        callback=_profile_callback,
+        help="Time each stage and write a Chrome trace, with a per-stage "
+        "summary, to this file",
+    )(f)
+
+
+def all_filenames(directory, **walk_options):
+    for entry in walk(directory, **walk_options):
+        yield entry.path
 
 
 def prettyprint_json(obj, fp=None):
@@ -30,8 +77,15 @@ def prettyprint_json(obj, fp=None):
 __all__ = (
     "APP_SCOPES",
     "common_options",
+    "profile_option",
+    "search_backend_option",
     "all_filenames",
     "prettyprint_json",
+    "imap_ordered",
+    "imap_threaded",
+    "resolve_jobs",
+    "walk",
+    "WalkEntry",
     "token_storage_adapter",
     "internal_auth_client",
     "auth_client",
@@ -0,0 +1,20 @@
+import os
+
+import ruamel.yaml
+
+yaml = ruamel.yaml.YAML(typ="safe")
+
+_cache = {}
+
+
+def load_settings(path, settings_class):
+    # settings are parsed once per process and then reused until the file's
+    # mtime changes, so that long-running workers pick up edits without a restart
+    mtime = os.stat(path).st_mtime_ns
+    key = (os.path.abspath(path), settings_class)
+    cached = _cache.get(key)
+    if cached is None or cached[0] != mtime:
+        with open(path) as fp:
+            cached = (mtime, settings_class(yaml.load(fp)))
+        _cache[key] = cached
+    return cached[1]
@@ -0,0 +1,63 @@
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _settle(ch, method, future):
+    # runs on the connection thread once processing has finished
+    #
+    # `future` returns None on success, or an error message
+    try:
+        err_msg = future.result()
+    except Exception as err:  # the worker process died or could not run the job
+        err_msg = f"worker failure: {err}"
+    if err_msg is None:
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+    else:
+        # give a failed message one more try, then drop it rather than letting
+        # it loop through the queue forever
+        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=not method.redelivered)
+
+
+def consume(connection, channel, queue, process_message, workers):
+    """
+    Consume `queue`, handing each message body to `process_message` in a pool
+    of `workers` processes, and acknowledging it only once it has been
+    processed. `process_message` returns None on success, or an error message.
+
+    Processing happens off the connection thread, so heartbeats keep flowing
+    however long a single message takes. The channel's prefetch count should be
+    at least `workers`, or some of them will sit idle.
+    """
+    pool = {"executor": ProcessPoolExecutor(max_workers=workers)}
+
+    def on_done(ch, method, future):
+        # pika channels may only be used from the connection thread
+        connection.add_callback_threadsafe(
+            functools.partial(_settle, ch, method, future)
+        )
+
+    def callback(ch, method, properties, body):
+        try:
+            future = pool["executor"].submit(process_message, body)
+        except BrokenProcessPool as err:
+            # a worker died; messages already handed to the pool fail (and are
+            # settled) on their own, and later ones go to a fresh pool
+            print(f"[consume] worker pool broken, restarting it: {err}")
+            pool["executor"].shutdown(wait=False)
+            pool["executor"] = ProcessPoolExecutor(max_workers=workers)
+            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            return
+        except Exception as err:
+            print(f"[consume] could not hand over message: {err}")
+            ch.basic_nack(
+                delivery_tag=method.delivery_tag, requeue=not method.redelivered
+            )
+            return
+        future.add_done_callback(functools.partial(on_done, ch, method))
+
+    channel.basic_consume(queue=queue, on_message_callback=callback, auto_ack=False)
+    try:
+        channel.start_consuming()
+    finally:
+        pool["executor"].shutdown(wait=True)
@@ -0,0 +1,344 @@
+import datetime
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import globus_sdk
+import requests
+
+# the fake's indices, entries and tasks are kept here, so that `submit`, `watch`
+# and `query` run as separate commands still see each other's work
+DEFAULT_PATH = "output/fake_search.sqlite"
+
+# the status a failed call is reported with; retried by `call_with_retry`
+FAILURE_STATUS = 503
+
+# task states of the Search API
+PENDING = "PENDING"
+SUCCESS = "SUCCESS"
+FAILED = "FAILED"
+
+
+class FakeResponse:
+    # the parts of `globus_sdk.GlobusHTTPResponse` which the commands use
+    def __init__(self, data, http_status=200):
+        self.data = data
+        self.http_status = http_status
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+
+def _api_error(status, code, message):
+    response = requests.Response()
+    response.status_code = status
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps({"code": code, "message": message}).encode()
+    return globus_sdk.SearchAPIError(response)
+
+
+def _timestamp(seconds):
+    return datetime.datetime.utcfromtimestamp(seconds).isoformat() + "Z"
+
+
+def _field_values(content, field_name):
+    # the values of a (possibly dotted) field, as a list
+    value = content
+    for part in field_name.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return []
+        value = value[part]
+    return value if isinstance(value, list) else [value]
+
+
+def _matches(content, text, terms, filters):
+    if any(term not in text for term in terms):
+        return False
+    for query_filter in filters:
+        values = {str(v) for v in _field_values(content, query_filter["field_name"])}
+        wanted = {str(v) for v in query_filter.get("values", [])}
+        if query_filter.get("type", "match_all") == "match_any":
+            if not values & wanted:
+                return False
+        elif not wanted <= values:
+            return False
+    return True
+
+
+class FakeSearchClient:
+    """
+    A stand-in for `globus_sdk.SearchClient` which keeps everything in a local
+    SQLite file, for benchmarking and load testing without network access.
+
+    It covers what the commands use: ingest, get_task, post_search,
+    delete_subject and delete_entry, and index creation and lookup through
+    post and get. Each call sleeps for about `latency` seconds, and a fraction
+    `failure_rate` of calls fail with a 503 error. A task completes
+    `task_seconds` after it was submitted, and a fraction `task_failure_rate` of
+    ingest tasks end up FAILED, without changing the index.
+
+    Searches match each word of the query as a case-insensitive substring of an
+    entry's content, and apply `match_all` and `match_any` filters; visibility
+    is not checked. Indices are created on first use.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_PATH,
+        latency=0.0,
+        failure_rate=0.0,
+        task_seconds=0.0,
+        task_failure_rate=0.0,
+        seed=None,
+    ):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self.latency = float(latency)
+        self.failure_rate = float(failure_rate)
+        self.task_seconds = float(task_seconds)
+        self.task_failure_rate = float(task_failure_rate)
+        self._random = random.Random(None if seed is None else int(seed))
+        # one connection, shared by the threads of `submit --concurrency` and
+        # `watch`; they take turns at the database, but not at sleeping
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(
+            """\
+CREATE TABLE IF NOT EXISTS indices (
+    index_id TEXT PRIMARY KEY,
+    display_name TEXT,
+    description TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    index_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    visible_to TEXT NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (index_id, subject, entry_id)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    index_id TEXT NOT NULL,
+    task_type TEXT NOT NULL,
+    created REAL NOT NULL,
+    completes REAL NOT NULL,
+    final_state TEXT NOT NULL
+);"""
+        )
+
+    def _call(self, name):
+        # every request pays the latency, and may fail, before it does anything
+        with self._lock:
+            jitter = self._random.uniform(0.5, 1.5)
+            fail = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency * jitter)
+        if fail:
+            raise _api_error(
+                FAILURE_STATUS, "ServiceUnavailable", f"simulated failure of {name}"
+            )
+
+    def _ensure_index(self, index_id, display_name=None, description=None):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO indices "
+            "(index_id, display_name, description, created) VALUES (?, ?, ?, ?)",
+            (index_id, display_name, description, time.time()),
+        )
+
+    def _new_task(self, index_id, task_type, succeeds=True):
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO tasks "
+            "(task_id, index_id, task_type, created, completes, final_state) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                task_id,
+                index_id,
+                task_type,
+                now,
+                now + self.task_seconds,
+                SUCCESS if succeeds else FAILED,
+            ),
+        )
+        return task_id
+
+    def _index_doc(self, index_id):
+        row = self._conn.execute(
+            "SELECT display_name, description, created FROM indices "
+            "WHERE index_id = ?",
+            (index_id,),
+        ).fetchone()
+        if row is None:
+            raise _api_error(404, "NotFound.NoSuchIndex", f"no index {index_id}")
+        display_name, description, created = row
+        num_subjects, num_entries = self._conn.execute(
+            "SELECT COUNT(DISTINCT subject), COUNT(*) FROM entries "
+            "WHERE index_id = ?",
+            (index_id,),
+        ).fetchone()
+        return {
+            "id": index_id,
+            "display_name": display_name,
+            "description": description,
+            "status": "open",
+            "is_trial": True,
+            "creation_date": _timestamp(created),
+            "num_subjects": num_subjects,
+            "num_entries": num_entries,
+        }
+
+    def ingest(self, index_id, data):
+        self._call("ingest")
+        if data.get("ingest_type") == "GMetaEntry":
+            entries = [data["ingest_data"]]
+        else:
+            entries = data["ingest_data"]["gmeta"]
+        with self._lock:
+            self._ensure_index(index_id)
+            succeeds = self._random.random() >= self.task_failure_rate
+            task_id = self._new_task(index_id, "INGEST", succeeds)
+            # the entries are visible right away, rather than once the task is done
+            if succeeds:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries "
+                    "(index_id, subject, entry_id, visible_to, content) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            index_id,
+                            entry["subject"],
+                            entry.get("id") or "",
+                            json.dumps(entry.get("visible_to", [])),
+                            json.dumps(entry.get("content", {})),
+                        )
+                        for entry in entries
+                    ],
+                )
+            self._conn.commit()
+        return FakeResponse({"task_id": task_id, "acknowledged": True, "success": True})
+
+    def get_task(self, task_id):
+        self._call("get_task")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT index_id, task_type, created, completes, final_state "
+                "FROM tasks WHERE task_id = ?",
+                (task_id,),
+            ).fetchone()
+        if row is None:
+            raise _api_error(404, "NotFound.NoSuchTask", f"no task {task_id}")
+        index_id, task_type, created, completes, final_state = row
+        done = time.time() >= completes
+        state = final_state if done else PENDING
+        return FakeResponse(
+            {
+                "task_id": task_id,
+                "index_id": index_id,
+                "task_type": task_type,
+                "state": state,
+                "state_description": state.capitalize(),
+                "creation_date": _timestamp(created),
+                "completion_date": _timestamp(completes) if done else None,
+                "message": "simulated failure" if state == FAILED else "",
+            }
+        )
+
+    def delete_subject(self, index_id, subject, **params):
+        self._call("delete_subject")
+        with self._lock:
+            self._ensure_index(index_id)
+            self._conn.execute(
+                "DELETE FROM entries WHERE index_id = ? AND subject = ?",
+                (index_id, subject),
+            )
+            task_id = self._new_task(index_id, "DELETE_BY_SUBJECT")
+            self._conn.commit()
+        return FakeResponse({"task_id": task_id, "acknowledged": True})
+
+    def delete_entry(self, index_id, subject, entry_id=None, **params):
+        self._call("delete_entry")
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM entries "
+                "WHERE index_id = ? AND subject = ? AND entry_id = ?",
+                (index_id, subject, entry_id or ""),
+            ).rowcount
+            self._conn.commit()
+        if not removed:
+            raise _api_error(404, "NotFound.Generic", f"no entry {entry_id!r}")
+        return FakeResponse({"removed": True})
+
+    def post_search(self, index_id, data):
+        self._call("post_search")
+        terms = [t.lower() for t in data.get("q", "*").split() if t != "*"]
+        filters = data.get("filters", [])
+        offset = int(data.get("offset", 0))
+        limit = int(data.get("limit", 10))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT subject, entry_id, content FROM entries "
+                "WHERE index_id = ? ORDER BY subject, entry_id",
+                (index_id,),
+            ).fetchall()
+
+        # results are grouped by subject, as in the real service
+        subjects = {}
+        for subject, entry_id, text in rows:
+            content = json.loads(text)
+            if _matches(content, text.lower(), terms, filters):
+                subjects.setdefault(subject, []).append(
+                    {"entry_id": entry_id or None, "content": content}
+                )
+        page = list(subjects.items())[offset : offset + limit]
+        return FakeResponse(
+            {
+                "@datatype": "GSearchResult",
+                "count": len(page),
+                "offset": offset,
+                "total": len(subjects),
+                "has_next_page": offset + len(page) < len(subjects),
+                "gmeta": [
+                    {"@datatype": "GMetaResult", "subject": s, "entries": entries}
+                    for s, entries in page
+                ],
+            }
+        )
+
+    def post(self, path, json_body=None, **kwargs):
+        # creating an index is the only POST made outside the methods above
+        self._call("post")
+        if path.rstrip("/") != "/beta/index":
+            raise _api_error(404, "NotFound.Generic", f"no route POST {path}")
+        body = json_body or {}
+        index_id = str(uuid.uuid4())
+        with self._lock:
+            self._ensure_index(
+                index_id, body.get("display_name"), body.get("description")
+            )
+            self._conn.commit()
+            return FakeResponse(self._index_doc(index_id))
+
+    def get(self, path, **kwargs):
+        self._call("get")
+        prefix = "/v1/index/"
+        if not path.startswith(prefix):
+            raise _api_error(404, "NotFound.Generic", f"no route GET {path}")
+        with self._lock:
+            return FakeResponse(self._index_doc(path[len(prefix) :].strip("/")))
+
+    def close(self):
+        self._conn.close()
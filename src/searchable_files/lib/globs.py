@@ -0,0 +1,60 @@
+import fnmatch
+import re
+
+_MAGIC_CHARS = re.compile(r"[*?[]")
+
+
+def _literal_extension(pattern):
+    # the extension a pattern requires, if it ends in one with no wildcards,
+    # e.g. "*.txt" -> "txt" but "data/*" -> None and "*.t?t" -> None
+    if "." not in pattern:
+        return None
+    ext = pattern.rsplit(".", 1)[1]
+    if not ext or "/" in ext or _MAGIC_CHARS.search(ext):
+        return None
+    return ext
+
+
+class GlobSet:
+    """
+    A list of fnmatch-style patterns, compiled once for repeated matching.
+
+    Patterns without wildcards are looked up in a dict, and patterns which end
+    in a literal extension are bucketed by it, so a name is only tested against
+    the patterns which could possibly match it.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._exact = {}
+        self._by_extension = {}
+        self._other = []
+        for index, pattern in enumerate(self.patterns):
+            if not _MAGIC_CHARS.search(pattern):
+                self._exact.setdefault(pattern, []).append(index)
+                continue
+            compiled = (index, re.compile(fnmatch.translate(pattern)))
+            ext = _literal_extension(pattern)
+            if ext is None:
+                self._other.append(compiled)
+            else:
+                self._by_extension.setdefault(ext, []).append(compiled)
+
+    def _candidates(self, name):
+        ext = _literal_extension(name)
+        if ext is not None:
+            yield from self._by_extension.get(ext, ())
+        yield from self._other
+
+    def match(self, name):
+        if name in self._exact:
+            return True
+        return any(regex.match(name) for _, regex in self._candidates(name))
+
+    def matching(self, name):
+        # indices of every pattern which matches, in the order they were given
+        found = list(self._exact.get(name, ()))
+        found.extend(
+            index for index, regex in self._candidates(name) if regex.match(name)
+        )
+        return sorted(found)
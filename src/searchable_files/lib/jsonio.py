@@ -0,0 +1,73 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "pretty" is indented for reading; "compact" is a single line; "ndjson" writes
+# a list of records one compact record per line
+OUTPUT_FORMATS = ("pretty", "compact", "ndjson")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(obj, pretty=False):
+    """
+    Encode `obj` as UTF-8 JSON bytes. Non-ASCII text is written as is.
+
+    Pretty output always comes from the standard library, so that it stays
+    byte-for-byte what the commands have always written (including NaN and
+    Infinity, which are written as such). Compact output uses orjson if it is
+    installed, which writes non-finite floats as null.
+    """
+    if orjson is not None and not pretty:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. an integer which does not fit in 64 bits; the stdlib copes
+            pass
+    if pretty:
+        text = json.dumps(obj, indent=2, separators=(",", ": "), ensure_ascii=False)
+    else:
+        text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+    return text.encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. the NaN written by the standard library, which orjson rejects
+            pass
+    return json.loads(data)
+
+
+def load(path):
+    with open(path, "rb") as fp:
+        return loads(fp.read())
+
+
+def iter_ndjson(path):
+    with open(path, "rb") as fp:
+        for line in fp:
+            if line.strip():
+                yield loads(line)
+
+
+def encode(obj, output_format="pretty"):
+    # the bytes of a whole output file; an "ndjson" object is a list of records
+    if output_format == "ndjson":
+        return b"".join(dumps(record) + b"\n" for record in obj)
+    if output_format == "pretty":
+        # without a trailing newline, like `prettyprint_json`
+        return dumps(obj, pretty=True)
+    return dumps(obj) + b"\n"
+
+
+def write(path, obj, output_format="pretty"):
+    # encoded in one go and written as bytes, without a text layer in between
+    with open(path, "wb") as fp:
+        fp.write(encode(obj, output_format))
@@ -0,0 +1,49 @@
+import logging
+import logging.handlers
+import os
+
+# where the extract readers have always written their progress notes
+MESSAGES_PATH = "/tmp/messages.txt"
+
+# records held in memory before they are written out together
+BUFFER_RECORDS = 256
+
+_handlers = {}
+
+
+def buffered_file_handler(path, capacity=BUFFER_RECORDS):
+    # the file is opened once, on the first flush, and kept open; records are
+    # written out in batches of `capacity`, and straight away for errors
+    target = logging.FileHandler(path, mode="a", delay=True)
+    target.setFormatter(logging.Formatter("%(asctime)s %(name)s: %(message)s"))
+    return logging.handlers.MemoryHandler(
+        capacity, flushLevel=logging.ERROR, target=target, flushOnClose=True
+    )
+
+
+def setup_logging(logger_name="searchable_files", path=MESSAGES_PATH, **options):
+    """
+    Send the records of `logger_name` (and its children) to `path`, through a
+    buffered handler. Calling this again for the same logger and path is a no-op.
+    """
+    key = (logger_name, path)
+    if key not in _handlers:
+        handler = buffered_file_handler(path, **options)
+        logger = logging.getLogger(logger_name)
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        _handlers[key] = handler
+    return logging.getLogger(logger_name)
+
+
+def flush_logs():
+    # worker processes exit without running atexit hooks, so they flush at the
+    # end of each unit of work instead
+    for handler in _handlers.values():
+        handler.flush()
+
+
+# records still buffered when a process forks would otherwise be written twice,
+# once by the parent and once by the child
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=flush_logs)
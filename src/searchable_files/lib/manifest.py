@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+
+# number of stored documents between commits
+COMMIT_INTERVAL = 500
+
+# seconds to wait for another process's write transaction to finish before
+# giving up with "database is locked"
+BUSY_TIMEOUT = 60
+
+
+def manifest_path_for(output_directory):
+    # the manifest lives next to the output directory, not inside it, so that it
+    # is never read back as one of the extracted documents
+    return os.path.normpath(output_directory) + ".manifest.sqlite"
+
+
+class ExtractionManifest:
+    """
+    A persistent record of previously extracted files.
+
+    Entries are keyed on the path of the file and are only considered valid while
+    the size, mtime, and inode of the file are unchanged, and while `fingerprint`
+    (of the extractor's settings and version) is the same as when they were
+    stored.
+    """
+
+    def __init__(self, path, fingerprint=None, commit_interval=COMMIT_INTERVAL):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self.fingerprint = fingerprint
+        self.commit_interval = commit_interval
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """\
+CREATE TABLE IF NOT EXISTS extracted (
+    relpath TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    file_uuid TEXT,
+    document TEXT NOT NULL,
+    fingerprint TEXT
+)"""
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(extracted)")]
+        if "fingerprint" not in columns:
+            # a manifest from before fingerprints; none of its entries will match
+            self._conn.execute("ALTER TABLE extracted ADD COLUMN fingerprint TEXT")
+        self._pending = 0
+
+    def lookup(self, relpath, info, file_uuid=None):
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, inode, file_uuid, document, fingerprint "
+            "FROM extracted WHERE relpath = ?",
+            (relpath,),
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, inode, cached_uuid, document, fingerprint = row
+        if (size, mtime_ns, inode) != (info.st_size, info.st_mtime_ns, info.st_ino):
+            return None
+        # extracted with other settings, or by another version of the extractor
+        if fingerprint != self.fingerprint:
+            return None
+        # a caller asking for a specific identifier cannot reuse a document which
+        # was rendered for a different one
+        if file_uuid is not None and file_uuid != cached_uuid:
+            return None
+        return json.loads(document)
+
+    def store(self, relpath, info, document, file_uuid=None):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO extracted "
+            "(relpath, size, mtime_ns, inode, file_uuid, document, fingerprint) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                relpath,
+                info.st_size,
+                info.st_mtime_ns,
+                info.st_ino,
+                file_uuid,
+                json.dumps(document, ensure_ascii=False),
+                self.fingerprint,
+            ),
+        )
+        self._pending += 1
+        if self._pending >= self.commit_interval:
+            self.commit()
+
+    def prune(self, relpaths):
+        # forget all files but `relpaths`; returns how many were forgotten
+        self.commit()
+        self._conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS keep (relpath TEXT PRIMARY KEY)"
+        )
+        self._conn.execute("DELETE FROM keep")
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO keep (relpath) VALUES (?)",
+            ((relpath,) for relpath in relpaths),
+        )
+        num_removed = self._conn.execute(
+            "DELETE FROM extracted WHERE relpath NOT IN (SELECT relpath FROM keep)"
+        ).rowcount
+        self._conn.execute("DELETE FROM keep")
+        self.commit()
+        return num_removed
+
+    def clear(self):
+        # forget every file, so that all of them are extracted again
+        self._conn.execute("DELETE FROM extracted")
+        self.commit()
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,90 @@
+import collections
+import itertools
+import os
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from . import log, timing
+
+# chunks in flight per worker before the consumer must catch up
+WINDOW_PER_JOB = 4
+
+
+def resolve_jobs(jobs):
+    # 0 (or a negative number) means "one worker per core"
+    if jobs is None or jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _chunks(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _apply_chunk(fn, chunk, profile=False):
+    # runs in a worker process; the spans it records are sent back along with
+    # the results, to be merged into the parent's profile
+    if profile:
+        timing.enable()
+    results = [fn(item) for item in chunk]
+    log.flush_logs()
+    return results, timing.drain()
+
+
+def _chunk_results(future):
+    results, events = future.result()
+    timing.merge(events)
+    return results
+
+
+def imap_ordered(fn, items, jobs=1, chunksize=1, window=None):
+    # run `fn` over `items`, yielding results in input order so that output stays
+    # deterministic regardless of which worker finishes first
+    #
+    # with a single job everything stays in-process, which keeps tracebacks and
+    # debuggers usable
+    if jobs <= 1:
+        for item in items:
+            yield fn(item)
+        return
+
+    # unlike `Executor.map`, input is consumed lazily and at most `window` chunks
+    # are in flight at once, so memory use does not grow with the input
+    if window is None:
+        window = jobs * WINDOW_PER_JOB
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        for chunk in _chunks(items, chunksize):
+            pending.append(executor.submit(_apply_chunk, fn, chunk, timing.enabled()))
+            if len(pending) >= window:
+                yield from _chunk_results(pending.popleft())
+        while pending:
+            yield from _chunk_results(pending.popleft())
+
+
+def imap_threaded(fn, items, workers, window=None):
+    # run `fn` over `items` on a thread pool, yielding results as they complete
+    #
+    # meant for I/O-bound work like HTTP calls; input is consumed lazily with at
+    # most `window` calls in flight
+    if window is None:
+        window = workers * WINDOW_PER_JOB
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for item in items:
+            pending.add(executor.submit(fn, item))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in wait(pending).done:
+            yield future.result()
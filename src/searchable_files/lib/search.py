@@ -1,12 +1,64 @@
+import os
+import random
+import time
+
+import click
 import globus_sdk
+import requests
 
 from .auth import internal_auth_client, token_storage_adapter
+from .fake_search import FakeSearchClient
 from ..globus_auth import get_authorizer
 
 SEARCH_RESOURCE_SERVER = "search.api.globus.org"
 
+# which search service the commands talk to, as "globus" (the default), or as
+# "fake" followed by options for `FakeSearchClient`, e.g.
+#   fake:latency=0.05,failure_rate=0.01,task_seconds=2
+# set in the environment, so that worker processes use the same backend
+SEARCH_BACKEND_ENV = "SEARCHABLE_FILES_SEARCH_BACKEND"
+SEARCH_BACKENDS = ("globus", "fake")
+
+
+def parse_search_backend(spec):
+    # returns (backend name, {option: value})
+    name, _, params = (spec or "globus").partition(":")
+    if name not in SEARCH_BACKENDS:
+        raise click.UsageError(
+            f"unknown search backend {name!r}, expected one of "
+            + ", ".join(SEARCH_BACKENDS)
+        )
+    options = {}
+    for param in filter(None, params.split(",")):
+        key, sep, value = param.partition("=")
+        if not sep:
+            raise click.UsageError(f"search backend option {param!r} has no value")
+        options[key.strip()] = value.strip()
+    if name == "globus" and options:
+        raise click.UsageError("the globus search backend takes no options")
+    return name, options
+
+
+def search_backend():
+    return parse_search_backend(os.environ.get(SEARCH_BACKEND_ENV))
+
+
+def _fake_search_client():
+    # None, unless the fake backend is selected
+    name, options = search_backend()
+    if name != "fake":
+        return None
+    try:
+        return FakeSearchClient(**options)
+    except TypeError as err:
+        raise click.UsageError(f"bad fake search backend options: {err}")
+
 
 def search_client(authenticated=True):
+    fake = _fake_search_client()
+    if fake is not None:
+        return fake
+
     storage_adapter = token_storage_adapter()
     as_dict = storage_adapter.read_as_dict()
 
@@ -31,6 +83,52 @@ GLOBUS_AUTH_SCOPE_INGEST = "urn:globus:auth:scope:search.api.globus.org:ingest"
 
 
 def new_search_client(authenticated=True):
+    fake = _fake_search_client()
+    if fake is not None:
+        return fake
+
     authorizer = get_authorizer(GLOBUS_AUTH_SCOPE_INGEST)
 
     return globus_sdk.SearchClient(authorizer=authorizer, app_name="searchable-files")
+
+
+def shared_search_client():
+    # the worker builds its client once per process and reuses it (and its
+    # connection pool) for every message
+    if not hasattr(shared_search_client, "_instance"):
+        shared_search_client._instance = new_search_client()
+    return shared_search_client._instance
+
+
+def pool_connections(client, size):
+    # by default a session keeps 10 connections per host; size the pool to match
+    # the number of threads sharing the client so connections are reused rather
+    # than discarded
+    #
+    # the fake backend has no connections to pool
+    if not hasattr(client, "_session"):
+        return client
+    adapter = requests.adapters.HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    client._session.mount("https://", adapter)
+    return client
+
+
+# rate limiting and server-side failures are worth retrying, other errors are not
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def call_with_retry(fn, *args, max_attempts=5, backoff=0.5, max_backoff=30, **kwargs):
+    attempt = 1
+    while True:
+        try:
+            return fn(*args, **kwargs)
+        except globus_sdk.NetworkError:
+            if attempt >= max_attempts:
+                raise
+        except globus_sdk.GlobusAPIError as err:
+            if err.http_status not in RETRY_STATUSES or attempt >= max_attempts:
+                raise
+        # exponential backoff with full jitter, so that many threads which failed
+        # together do not all retry together
+        time.sleep(random.uniform(0, min(max_backoff, backoff * 2 ** attempt)))
+        attempt += 1
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import re
+import sqlite3
+
+from . import jsonio
+from .walk import walk
+
+# how extracted documents are laid out in the output directory:
+#   flat      one <sha256>.json per input file, all in one directory
+#   sharded   the same files, under <2 hex digits>/<2 hex digits>/ subdirectories
+#   segments  rolling NDJSON segment files, with a SQLite index of record offsets
+LAYOUTS = ("flat", "sharded", "segments")
+
+# a segment is closed, and a new one started, once it grows past this size
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+# number of indexed records between commits
+COMMIT_INTERVAL = 500
+
+INDEX_NAME = "index.sqlite"
+SEGMENT_DIR = "segments"
+
+# the name of a document written by `DirectoryStore`
+_DOCUMENT_NAME = re.compile(r"^([0-9a-f]{64})\.json$")
+# the name of a first-level subdirectory of a sharded `DirectoryStore`
+_SHARD_NAME = re.compile(r"^[0-9a-f]{2}$")
+
+
+def record_key(filename):
+    return hashlib.sha256(filename.encode("utf-8")).hexdigest()
+
+
+class DirectoryStore:
+    """
+    Extracted documents as one JSON file each, optionally sharded into two
+    levels of subdirectories by the leading digits of their key, so that no
+    directory holds more than a few hundred files even for millions of inputs.
+    """
+
+    def __init__(self, directory, sharded=False, output_format="pretty"):
+        self.directory = directory
+        self.sharded = sharded
+        self.output_format = output_format
+
+    def path_for(self, filename):
+        key = record_key(filename)
+        if self.sharded:
+            return os.path.join(self.directory, key[:2], key[2:4], key + ".json")
+        return os.path.join(self.directory, key + ".json")
+
+    def contains(self, filename):
+        return os.path.exists(self.path_for(filename))
+
+    def put(self, filename, document):
+        path = self.path_for(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        jsonio.write(path, document, self.output_format)
+
+    def get(self, filename):
+        path = self.path_for(filename)
+        if not os.path.exists(path):
+            return None
+        return jsonio.load(path)
+
+    def refs(self):
+        # what `load_record` needs to read each document: here, its path
+        for entry in walk(self.directory):
+            yield entry.path
+
+    def prune(self, filenames):
+        # remove the documents of all files but `filenames`; returns how many
+        keep = {record_key(filename) for filename in filenames}
+        num_removed = 0
+        for entry in walk(self.directory):
+            match = _DOCUMENT_NAME.match(entry.name)
+            if match and match.group(1) not in keep:
+                os.remove(entry.path)
+                num_removed += 1
+        return num_removed
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SegmentStore:
+    """
+    Extracted documents appended, one compact JSON line each, to a sequence of
+    NDJSON segment files, with an index of where each document's latest version
+    starts.
+
+    Re-extracting a file appends a new record and repoints the index; the old
+    record stays in its segment but is no longer read. Reading the whole store
+    goes through the segments in order, so the disk sees sequential reads.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.segment_dir = os.path.join(directory, SEGMENT_DIR)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, INDEX_NAME))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """\
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    relpath TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+)"""
+        )
+        self._pending = 0
+        self._segment = None
+        self._fp = None
+
+    def _segment_path(self, segment):
+        return os.path.join(self.segment_dir, f"segment-{segment:06d}.ndjson")
+
+    def _writer(self):
+        # continue the last segment of a previous run, if it has room left
+        if self._fp is None:
+            row = self._conn.execute("SELECT MAX(segment) FROM records").fetchone()
+            self._segment = row[0] if row[0] is not None else 0
+            self._fp = open(self._segment_path(self._segment), "ab")
+        if self._fp.tell() >= SEGMENT_BYTES:
+            self._fp.close()
+            self._segment += 1
+            self._fp = open(self._segment_path(self._segment), "ab")
+        return self._fp
+
+    def contains(self, filename):
+        row = self._conn.execute(
+            "SELECT 1 FROM records WHERE key = ?", (record_key(filename),)
+        ).fetchone()
+        return row is not None
+
+    def put(self, filename, document):
+        fp = self._writer()
+        data = jsonio.dumps(document) + b"\n"
+        offset = fp.tell()
+        fp.write(data)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO records (key, relpath, segment, offset, length) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (record_key(filename), filename, self._segment, offset, len(data)),
+        )
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self.commit()
+
+    def get(self, filename):
+        row = self._conn.execute(
+            "SELECT segment, offset, length FROM records WHERE key = ?",
+            (record_key(filename),),
+        ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length = row
+        # the record may still be sitting in the write buffer
+        if self._fp is not None and segment == self._segment:
+            self._fp.flush()
+        with open(self._segment_path(segment), "rb") as fp:
+            fp.seek(offset)
+            return jsonio.loads(fp.read(length))
+
+    def refs(self):
+        # the bytes of every live record, read in file order with one handle per
+        # segment, so that the disk sees one sequential pass over each segment;
+        # the records are parsed by whoever calls `load_record` on them
+        self.commit()
+        rows = self._conn.execute(
+            "SELECT segment, offset, length FROM records ORDER BY segment, offset"
+        )
+        fp, current = None, None
+        try:
+            for segment, offset, length in rows:
+                if segment != current:
+                    if fp is not None:
+                        fp.close()
+                    fp, current = open(self._segment_path(segment), "rb"), segment
+                # only records which were replaced later are skipped over
+                if fp.tell() != offset:
+                    fp.seek(offset)
+                yield fp.read(length)
+        finally:
+            if fp is not None:
+                fp.close()
+
+    def prune(self, filenames):
+        # drop the index entries of all files but `filenames`; returns how many
+        #
+        # the records stay in their segments, but are no longer read
+        self.commit()
+        self._conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS keep (key TEXT PRIMARY KEY)"
+        )
+        self._conn.execute("DELETE FROM keep")
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO keep (key) VALUES (?)",
+            ((record_key(filename),) for filename in filenames),
+        )
+        num_removed = self._conn.execute(
+            "DELETE FROM records WHERE key NOT IN (SELECT key FROM keep)"
+        ).rowcount
+        self._conn.execute("DELETE FROM keep")
+        self.commit()
+        return num_removed
+
+    def commit(self):
+        # the data goes to disk before the index entries which point at it
+        if self._fp is not None:
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def detect_layout(directory):
+    # the layout of the documents already in `directory`, or None if it holds none
+    if os.path.exists(os.path.join(directory, INDEX_NAME)):
+        return "segments"
+    if not os.path.isdir(directory):
+        return None
+    for entry in os.scandir(directory):
+        if entry.is_file() and _DOCUMENT_NAME.match(entry.name):
+            return "flat"
+        if entry.is_dir() and _SHARD_NAME.match(entry.name):
+            return "sharded"
+    return None
+
+
+def open_store(directory, layout=None, output_format="pretty"):
+    """
+    Open the store of extracted documents in `directory`.
+
+    Without a `layout`, an existing segment store is recognized by its index,
+    and anything else is read as a directory of JSON files (flat or sharded,
+    which read back the same way).
+    """
+    if layout is None:
+        is_segments = os.path.exists(os.path.join(directory, INDEX_NAME))
+        layout = "segments" if is_segments else "sharded"
+    if layout == "segments":
+        return SegmentStore(directory)
+    return DirectoryStore(
+        directory, sharded=layout == "sharded", output_format=output_format
+    )
+
+
+def load_record(ref):
+    # a path, or the bytes of a segment record, as yielded by `refs()`
+    #
+    # a plain function of the reference, so that worker processes can read
+    # records without the store itself
+    if isinstance(ref, str):
+        return jsonio.load(ref)
+    return jsonio.loads(ref)
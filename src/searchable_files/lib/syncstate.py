@@ -0,0 +1,246 @@
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+
+# number of recorded entries between commits
+COMMIT_INTERVAL = 500
+
+# fields which differ between two renderings of the same file, and so must not
+# count as a change; the converter stamps `datePublished` with the current time
+VOLATILE_FIELDS = frozenset(["datePublished"])
+
+
+def _without_volatile_fields(value):
+    if isinstance(value, dict):
+        return {
+            k: _without_volatile_fields(v)
+            for k, v in value.items()
+            if k not in VOLATILE_FIELDS
+        }
+    if isinstance(value, list):
+        return [_without_volatile_fields(v) for v in value]
+    return value
+
+
+def entry_hash(entry):
+    # a hash of the GMetaEntry which only changes when its content does: keys
+    # are sorted, and volatile fields are left out
+    #
+    # always encoded by the standard library, so that installing or removing
+    # orjson (which formats some floats differently) does not change every hash
+    encoded = json.dumps(
+        _without_volatile_fields(entry),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def entry_key(entry):
+    # an entry is identified by its subject and ID; the default entry has no ID
+    return entry["subject"], entry.get("id") or ""
+
+
+class SyncState:
+    """
+    The entries of an index as of the last successful submission, as a hash of
+    each entry, keyed on (subject, entry ID).
+
+    Every entry seen during a run is marked with the number of the run, so that
+    entries which were submitted before but not seen this time can be found
+    and deleted from the index once the run is over.
+
+    Submitted entries are only pending until their ingest task is known to have
+    succeeded (see `confirm`); until then, they count as changed, and are sent
+    again by the next run.
+
+    `index_id` may be None when only confirming or discarding tasks.
+    """
+
+    def __init__(self, path, index_id=None):
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self.index_id = index_id
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """\
+CREATE TABLE IF NOT EXISTS entries (
+    index_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    run INTEGER NOT NULL,
+    PRIMARY KEY (index_id, subject, entry_id)
+)"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS pending (
+    task_id TEXT NOT NULL,
+    index_id TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    entry_id TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    run INTEGER NOT NULL
+)"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS pending_task ON pending (task_id)"
+        )
+        row = self._conn.execute(
+            "SELECT MAX(run) FROM ("
+            "SELECT run FROM entries WHERE index_id = ? "
+            "UNION ALL SELECT run FROM pending WHERE index_id = ?)",
+            (index_id, index_id),
+        ).fetchone()
+        self.run = (row[0] or 0) + 1
+        if index_id is not None:
+            # `submit` replaces the task list which `watch` reads, so the tasks
+            # of earlier runs which were never watched will not be confirmed
+            # now; their entries are sent again instead
+            self._conn.execute(
+                "DELETE FROM pending WHERE index_id = ? AND run < ?",
+                (index_id, self.run),
+            )
+        self.num_seen = 0
+        self._pending = 0
+
+    def changed_entries(self, entries, everything=False):
+        """
+        Mark `entries` as seen in this run, and return those which are new or
+        changed since they were last recorded (or all of them, if `everything`),
+        along with the (subject, entry ID, hash) triples to `expect` once they
+        have been submitted.
+        """
+        changed, hashes = [], []
+        for entry in entries:
+            subject, entry_id = entry_key(entry)
+            digest = entry_hash(entry)
+            row = self._conn.execute(
+                "SELECT hash FROM entries "
+                "WHERE index_id = ? AND subject = ? AND entry_id = ?",
+                (self.index_id, subject, entry_id),
+            ).fetchone()
+            if row is not None:
+                # even if submitting the new version fails, the entry must not
+                # be deleted as missing
+                self._conn.execute(
+                    "UPDATE entries SET run = ? "
+                    "WHERE index_id = ? AND subject = ? AND entry_id = ?",
+                    (self.run, self.index_id, subject, entry_id),
+                )
+            self.num_seen += 1
+            if everything or row is None or row[0] != digest:
+                changed.append(entry)
+                hashes.append((subject, entry_id, digest))
+        self._count(len(entries))
+        return changed, hashes
+
+    def expect(self, task_id, hashes):
+        # entries submitted in the ingest task `task_id`, to be recorded once the
+        # task succeeds
+        self._conn.executemany(
+            "INSERT INTO pending (task_id, index_id, subject, entry_id, hash, run) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(task_id, self.index_id, s, e, h, self.run) for s, e, h in hashes],
+        )
+        self._count(len(hashes))
+
+    def confirm(self, task_id):
+        # the task succeeded, so its entries are now in the index; a newer
+        # version which was already confirmed is kept
+        #
+        # INSERT OR REPLACE rather than an upsert, which needs SQLite 3.24
+        self._conn.execute(
+            """\
+INSERT OR REPLACE INTO entries (index_id, subject, entry_id, hash, run)
+SELECT pending.index_id, pending.subject, pending.entry_id, pending.hash, pending.run
+FROM pending LEFT JOIN entries
+ON entries.index_id = pending.index_id
+AND entries.subject = pending.subject
+AND entries.entry_id = pending.entry_id
+WHERE pending.task_id = ?
+AND (entries.run IS NULL OR pending.run >= entries.run)""",
+            (task_id,),
+        )
+        self.discard(task_id)
+
+    def discard(self, task_id):
+        # the task failed; its entries stay changed, and are sent again next time
+        self._conn.execute("DELETE FROM pending WHERE task_id = ?", (task_id,))
+        self._count(1)
+
+    def vanished(self):
+        """
+        Entries recorded by an earlier run which were not seen in this one, as a
+        list of (subject, entry IDs) pairs. The entry IDs are None if nothing
+        of the subject was seen (or submitted), and the whole subject should be
+        deleted.
+        """
+        self.commit()
+        rows = self._conn.execute(
+            """\
+SELECT subject, entry_id, EXISTS (
+    SELECT 1 FROM entries AS current
+    WHERE current.index_id = old.index_id
+    AND current.subject = old.subject
+    AND current.run = ?
+) OR EXISTS (
+    SELECT 1 FROM pending
+    WHERE pending.index_id = old.index_id
+    AND pending.subject = old.subject
+    AND pending.run = ?
+)
+FROM entries AS old
+WHERE index_id = ? AND run < ?
+ORDER BY subject, entry_id""",
+            (self.run, self.run, self.index_id, self.run),
+        ).fetchall()
+        result = []
+        for subject, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            still_present = group[0][2]
+            entry_ids = (
+                [entry_id for _, entry_id, _ in group] if still_present else None
+            )
+            result.append((subject, entry_ids))
+        return result
+
+    def forget(self, subject, entry_ids=None):
+        if entry_ids is None:
+            self._conn.execute(
+                "DELETE FROM entries WHERE index_id = ? AND subject = ?",
+                (self.index_id, subject),
+            )
+        else:
+            self._conn.executemany(
+                "DELETE FROM entries "
+                "WHERE index_id = ? AND subject = ? AND entry_id = ?",
+                [(self.index_id, subject, entry_id) for entry_id in entry_ids],
+            )
+        self._count(1)
+
+    def _count(self, num_changes):
+        self._pending += num_changes
+        if self._pending >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,135 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+# spans are only recorded once profiling is enabled (by `--profile`); until then
+# `span()` hands out a shared no-op context manager
+_enabled = False
+
+# (name, start_ns, duration_ns, pid, thread id, args)
+_events = []
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter_ns() - self.start
+        _events.append(
+            (
+                self.name,
+                self.start,
+                duration,
+                os.getpid(),
+                threading.get_ident(),
+                self.args,
+            )
+        )
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def enabled():
+    return _enabled
+
+
+def span(name, **args):
+    """
+    Time a stage of the pipeline, as a context manager:
+
+        with span("parse", extension=".tif"):
+            ...
+
+    Spans may nest. Keyword arguments are recorded with the span in the trace.
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def drain():
+    # hand over (and forget) the spans recorded so far, e.g. to send them from a
+    # worker process back to the parent
+    global _events
+    events, _events = _events, []
+    return events
+
+
+def _forget_inherited():
+    # a forked worker starts with a copy of the parent's spans; only the spans it
+    # records itself should be sent back by `drain()`
+    global _events
+    _events = []
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_inherited)
+
+
+def merge(events):
+    _events.extend(events)
+
+
+def summary():
+    # per stage: how many spans, and how long they took
+    # nested spans are counted in full by both the inner and the outer stage
+    durations = collections.defaultdict(list)
+    for name, _start, duration, _pid, _tid, _args in _events:
+        durations[name].append(duration)
+    return {
+        name: {
+            "count": len(values),
+            "total_ms": round(sum(values) / 1e6, 3),
+            "mean_ms": round(sum(values) / len(values) / 1e6, 3),
+            "max_ms": round(max(values) / 1e6, 3),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+def write_profile(path):
+    """
+    Write the recorded spans as a Chrome trace (for chrome://tracing or
+    Perfetto), with a per-stage summary under the "summary" key.
+    """
+    # perf_counter_ns is a system-wide monotonic clock on Linux, so spans from
+    # worker processes line up with those of the parent
+    origin = min((event[1] for event in _events), default=0)
+    trace_events = [
+        {
+            "name": name,
+            "cat": "searchable_files",
+            "ph": "X",
+            "ts": (start - origin) / 1000,
+            "dur": duration / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": {key: str(value) for key, value in args.items()},
+        }
+        for name, start, duration, pid, tid, args in _events
+    ]
+    with open(path, "w") as fp:
+        json.dump(
+            {
+                "traceEvents": trace_events,
+                "displayTimeUnit": "ms",
+                "summary": summary(),
+            },
+            fp,
+        )
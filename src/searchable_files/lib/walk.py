@@ -0,0 +1,115 @@
+import collections
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from .globs import GlobSet
+from .timing import span
+
+# directory listings are dominated by filesystem latency (especially on network
+# filesystems), not CPU, so threads are enough to overlap them
+WALK_WORKERS = 8
+
+# directories listed ahead of the consumer, per worker
+WINDOW_PER_WORKER = 4
+
+# `path` is relative to the current working directory, like the paths yielded by
+# `os.walk` + `os.path.relpath`, and `relpath` is relative to the root of the walk
+# `info` is the stat result of the file
+WalkEntry = collections.namedtuple(
+    "WalkEntry", ["path", "relpath", "name", "depth", "info"]
+)
+
+
+def _scan(path, relpath, depth, include, exclude):
+    # list one directory, stat'ing its files while the listing is hot
+    # returns (files, subdirectories), each sorted by name
+    #
+    # `relpath` is the directory's path relative to the root of the walk, or
+    # None for the root itself
+    files, subdirs = [], []
+    try:
+        with span("walk", path=path), os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        # like `os.walk`, an unreadable directory is skipped
+        return files, subdirs
+
+    for entry in entries:
+        if entry.name.endswith(".DS_Store"):
+            continue
+        entry_relpath = entry.name if relpath is None else f"{relpath}/{entry.name}"
+        if exclude is not None and exclude.match(entry_relpath):
+            continue
+        # `os.scandir(".")` names its entries "./name"; match `os.path.relpath`
+        entry_path = entry.name if path == "." else entry.path
+        try:
+            if entry.is_dir():
+                # like `os.walk`, symlinked directories are not followed
+                if not entry.is_symlink():
+                    subdirs.append((entry_path, entry_relpath))
+            elif entry.is_file():
+                if include is None or include.match(entry_relpath):
+                    with span("stat"):
+                        info = entry.stat()
+                    files.append(
+                        WalkEntry(entry_path, entry_relpath, entry.name, depth, info)
+                    )
+        except OSError:
+            # removed while we were looking, or a dangling link
+            continue
+    return files, subdirs
+
+
+def walk(directory, include=None, exclude=None, max_depth=None, workers=WALK_WORKERS):
+    """
+    Yield a `WalkEntry` for every file under `directory`, in sorted depth-first
+    order, with the files of each directory yielded together.
+
+    Subdirectories are listed by a pool of threads ahead of the consumer. Each
+    file is stat'ed once, during the listing, and the result travels with it.
+
+    `include` and `exclude` are fnmatch-style patterns matched against the path
+    relative to `directory`. An excluded directory is not descended into; only
+    files need to match `include`. Files directly in `directory` are at depth 0,
+    and `max_depth` limits how many levels below it are visited.
+    """
+    include = GlobSet(include) if include else None
+    exclude = GlobSet(exclude) if exclude else None
+    root = os.path.relpath(directory)
+
+    def scan(path, relpath, depth):
+        return _scan(path, relpath, depth, include, exclude)
+
+    def children(subdirs, depth):
+        if max_depth is not None and depth >= max_depth:
+            return []
+        # reversed, so that the first subdirectory is on top of the stack
+        return [[p, r, depth + 1, None] for p, r in reversed(subdirs)]
+
+    # [path, relpath, depth, future]; the top of the stack is visited next
+    stack = [[root, None, 0, None]]
+
+    if workers <= 1:
+        while stack:
+            path, relpath, depth, _future = stack.pop()
+            files, subdirs = scan(path, relpath, depth)
+            yield from files
+            stack.extend(children(subdirs, depth))
+        return
+
+    # the directories nearest the top of the stack are listed ahead of time
+    window = workers * WINDOW_PER_WORKER
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = 0
+        while stack:
+            for item in reversed(stack):
+                if in_flight >= window:
+                    break
+                if item[3] is None:
+                    item[3] = executor.submit(scan, *item[:3])
+                    in_flight += 1
+            path, relpath, depth, future = stack.pop()
+            files, subdirs = future.result()
+            in_flight -= 1
+            yield from files
+            stack.extend(children(subdirs, depth))
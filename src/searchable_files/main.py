@@ -4,13 +4,22 @@ import click
 import globus_sdk
 
 from . import assembler, extractor, manage_index, query, submitter, watcher
-from .lib import APP_SCOPES, common_options, internal_auth_client, token_storage_adapter
+from .lib import (
+    APP_SCOPES,
+    common_options,
+    internal_auth_client,
+    search_backend_option,
+    token_storage_adapter,
+)
+from .lib.log import setup_logging
 
 
 @click.group("searchable-files")
+@search_backend_option
 @common_options
 def cli():
-    pass
+    # the extract readers log their progress notes to a file
+    setup_logging()
 
 
 # index management
@@ -0,0 +1,56 @@
+import os
+
+from . import assembler, extractor
+from .lib.config import load_settings
+from .lib.search import call_with_retry, shared_search_client
+from .lib.timing import span
+
+
+def load_pipeline_settings():
+    # cached per process, so settings are not parsed again for every message
+    return (
+        load_settings(extractor.SETTING_PATH, extractor.Settings),
+        load_settings(assembler.SETTING_PATH, assembler.Settings),
+    )
+
+
+def run_pipeline(file_uuid, path, file_type, index_id, client=None, debug_output=None):
+    """
+    Extract, assemble, and submit the files named by one worker message.
+
+    Documents are handed from one stage to the next in memory. If `debug_output`
+    is set, the extracted and assembled documents are also written beneath it, in
+    the same layout as the standalone commands produce.
+
+    Returns the IDs of the ingest tasks which were submitted.
+    """
+    extract_settings, assemble_settings = load_pipeline_settings()
+    if client is None:
+        client = shared_search_client()
+
+    def entries():
+        documents = extractor.iter_handler_documents(
+            file_uuid, path, file_type, extract_settings
+        )
+        for filename, data in documents:
+            if debug_output is not None:
+                extractor.write_document(
+                    extractor.target_file(
+                        os.path.join(debug_output, "extracted"), filename
+                    ),
+                    data,
+                )
+            yield from assembler.build_entries_from_data(data, assemble_settings)
+
+    task_ids = []
+    batches = assembler.iter_batches(
+        assembler.encoded_entries(entries()), assemble_settings
+    )
+    for docid, batch in enumerate(batches):
+        if debug_output is not None:
+            assembler.flush_batch(batch, docid, os.path.join(debug_output, "assembled"))
+        gmeta = assembler.gmeta_list([entry for entry, _encoded in batch])
+        with span("ingest"):
+            res = call_with_retry(client.ingest, index_id, gmeta)
+        task_ids.append(res["task_id"])
+    return task_ids
@@ -1,7 +1,23 @@
 import click
 import globus_sdk
 
-from .lib import common_options, prettyprint_json, search_client, token_storage_adapter
+from .lib import (
+    common_options,
+    jsonio,
+    prettyprint_json,
+    search_client,
+    token_storage_adapter,
+)
+
+
+def echo_json(obj, output_format):
+    # NDJSON puts each search result (or the query itself) on a line of its own
+    if output_format == "ndjson":
+        obj = obj.get("gmeta", [obj]) if isinstance(obj, dict) else [obj]
+    if output_format == "pretty":
+        click.echo(prettyprint_json(obj))
+    else:
+        click.echo(jsonio.encode(obj, output_format).decode("utf-8"), nl=False)
 
 
 @click.command(
@@ -51,6 +67,15 @@ from .lib import common_options, prettyprint_json, search_client, token_storage_
     is_flag=True,
     help="Write the query structure to stdout instead of submitting it to the service",
 )
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(jsonio.OUTPUT_FORMATS),
+    default="pretty",
+    show_default=True,
+    help="Write results as indented JSON, single-line JSON, or NDJSON with one "
+    "result per line",
+)
 def query_cli(
     query_string,
     limit,
@@ -61,6 +86,7 @@ def query_cli(
     extensions,
     no_auth,
     dump_query,
+    output_format,
 ):
     adapter = token_storage_adapter()
     client = search_client(authenticated=not no_auth)
@@ -80,6 +106,6 @@ def query_cli(
         query_obj.add_filter("extension", extensions.split(","), type="match_any")
 
     if dump_query:
-        click.echo(prettyprint_json(query_obj))
+        echo_json(query_obj, output_format)
     else:
-        click.echo(prettyprint_json(client.post_search(index_id, query_obj).data))
+        echo_json(client.post_search(index_id, query_obj).data, output_format)
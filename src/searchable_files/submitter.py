@@ -1,18 +1,156 @@
-import json
+import functools
 import os
 
 import click
+import globus_sdk
+
+from .lib import (
+    all_filenames,
+    common_options,
+    imap_threaded,
+    jsonio,
+    profile_option,
+    search_client,
+    token_storage_adapter,
+)
+from .lib.search import call_with_retry, pool_connections, shared_search_client
+from .lib.syncstate import SyncState
+from .lib.timing import span
+
+
+def read_ingest_doc(filename):
+    # `assemble --format ndjson` writes just the entries, one per line
+    if filename.endswith(".ndjson"):
+        entries = list(jsonio.iter_ndjson(filename))
+        return {"ingest_type": "GMetaList", "ingest_data": {"gmeta": entries}}
+    return jsonio.load(filename)
+
+
+def submit_doc(client, index_id, filename):
+    data = read_ingest_doc(filename)
+    with span("ingest"):
+        res = call_with_retry(client.ingest, index_id, data)
+    return res["task_id"]
+
+
+def _submit_one(item, client, index_id):
+    # `item` is (filename, ingest document, entry hashes)
+    #
+    # a document which still fails after retrying is reported, not raised, so
+    # that the remaining documents are submitted
+    filename, data, hashes = item
+    try:
+        with span("ingest"):
+            res = call_with_retry(client.ingest, index_id, data)
+        return filename, res["task_id"], None, hashes
+    except globus_sdk.GlobusError as err:
+        return filename, None, f"{type(err).__name__}: {err}", hashes
+
+
+def _delta_docs(docs, sync_state, everything=False):
+    # cut each ingest document down to its new and changed entries, and drop
+    # the documents which are left empty
+    for filename, data in docs:
+        entries = data["ingest_data"]["gmeta"]
+        changed, hashes = sync_state.changed_entries(entries, everything)
+        if not changed:
+            continue
+        if len(changed) < len(entries):
+            data = {**data, "ingest_data": {**data["ingest_data"], "gmeta": changed}}
+        yield filename, data, hashes
+
+
+def _delete_one(item, client, index_id):
+    # `item` is (subject, entry IDs); without entry IDs the whole subject goes
+    subject, entry_ids = item
+    try:
+        task_ids = []
+        with span("delete"):
+            if entry_ids is None:
+                res = call_with_retry(client.delete_subject, index_id, subject)
+                task_ids.append(res["task_id"])
+            else:
+                for entry_id in entry_ids:
+                    res = call_with_retry(
+                        client.delete_entry, index_id, subject, entry_id=entry_id or None
+                    )
+                    if res.get("task_id"):
+                        task_ids.append(res["task_id"])
+        return item, task_ids, None
+    except globus_sdk.GlobusError as err:
+        return item, [], f"{type(err).__name__}: {err}"
+
+
+def _map(fn, items, concurrency):
+    if concurrency > 1:
+        return imap_threaded(fn, items, concurrency)
+    return map(fn, items)
 
-from .lib import all_filenames, common_options, search_client, token_storage_adapter
-from .lib.search import new_search_client
 
+def submit_all(
+    client, index_id, filenames, task_list_file, concurrency=1,
+    sync_state=None, full=False, delete=True,
+):
+    """
+    Submit the ingest documents in `filenames`, and write the IDs of their tasks
+    to `task_list_file`.
 
-def submit_doc(client, index_id, filename, task_list_file):
-    with open(filename) as fp:
-        data = json.load(fp)
-    res = client.ingest(index_id, data)
-    with open(task_list_file, "a") as fp:
-        fp.write(res["task_id"] + "\n")
+    With a `sync_state`, only entries which are new or have changed since they
+    were last confirmed by `watch` are submitted (unless `full`), and, if
+    `delete`, entries which were submitted before but are no longer in any
+    document are deleted.
+
+    Returns (filename or subject, error message) pairs for what failed.
+    """
+    # documents are read, and the sync state used, in this thread alone; task IDs
+    # are written through one buffered file handle
+    failures = []
+    docs = ((filename, read_ingest_doc(filename)) for filename in filenames)
+    if sync_state is not None:
+        docs = _delta_docs(docs, sync_state, everything=full)
+    else:
+        docs = ((filename, data, None) for filename, data in docs)
+
+    submit = functools.partial(_submit_one, client=client, index_id=index_id)
+    if concurrency > 1:
+        pool_connections(client, concurrency)
+
+    with open(task_list_file, "w") as fp:
+        for filename, task_id, err, hashes in _map(submit, docs, concurrency):
+            if err is not None:
+                failures.append((filename, err))
+                continue
+            fp.write(task_id + "\n")
+            if sync_state is not None:
+                # recorded as synced by `watch`, once the task has succeeded
+                sync_state.expect(task_id, hashes)
+
+        # an empty input is much more likely a mistake than a deleted archive
+        if sync_state is not None and delete and sync_state.num_seen:
+            remove = functools.partial(_delete_one, client=client, index_id=index_id)
+            vanished = sync_state.vanished()
+            for (subject, entry_ids), task_ids, err in _map(
+                remove, vanished, concurrency
+            ):
+                if err is not None:
+                    failures.append((subject, err))
+                    continue
+                for task_id in task_ids:
+                    fp.write(task_id + "\n")
+                sync_state.forget(subject, entry_ids)
+    return failures
+
+
+def _resolve_index_id(index_id):
+    if not index_id:
+        index_info = token_storage_adapter().read_config("index_info")
+        if index_info is None:
+            raise click.UsageError(
+                "Cannot submit without first setting up "
+                "an index or passing '--index-id'"
+            )
+        index_id = index_info["index_id"]
+    return index_id
 
 
 @click.command(
@@ -42,29 +180,53 @@ def submit_doc(client, index_id, filename, task_list_file):
     help="Override the index ID where the tasks should be submitted. "
     "If omitted, the index created with `create-index` will be used.",
 )
+@click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    type=int,
+    help="Number of ingest documents to upload in parallel",
+)
+@click.option(
+    "--sync-state",
+    default="output/sync_state.sqlite",
+    show_default=True,
+    help="SQLite file recording what has been submitted to each index, so that "
+    "only changes are submitted",
+)
+@click.option(
+    "--full",
+    default=False,
+    is_flag=True,
+    help="Submit every entry, even if it is unchanged since the last submission",
+)
+@click.option(
+    "--no-delete",
+    default=False,
+    is_flag=True,
+    help="Keep entries in the index whose files are no longer in the ingest "
+    "documents, instead of deleting them",
+)
+@profile_option
 @common_options
-def submit_cli(directory, output, index_id):
+def submit_cli(directory, output, index_id, concurrency, sync_state, full, no_delete):
     client = search_client()
 
     os.makedirs(output, exist_ok=True)
     task_list_file = os.path.join(output, "tasks.txt")
-    with open(task_list_file, "w"):  # empty the file (open in write mode)
-        pass
 
     # ./searchable-files extract && ./searchable-files assemble &&
     # ./searchable-files submit --index-id 76c5e7eb-6cb6-492c-ba80-7e47abff0586 && ./searchable-files watch
-    if not index_id:
-        index_info = token_storage_adapter().read_config("index_info")
-        if index_info is None:
-            raise click.UsageError(
-                "Cannot submit without first setting up "
-                "an index or passing '--index-id'"
-            )
-        index_id = index_info["index_id"]
+    index_id = _resolve_index_id(index_id)
 
-    for filename in all_filenames(directory):
-        submit_doc(client, index_id, filename, task_list_file)
+    with SyncState(sync_state, index_id) as state:
+        failures = submit_all(
+            client, index_id, all_filenames(directory), task_list_file, concurrency,
+            sync_state=state, full=full, delete=not no_delete,
+        )
 
+    for filename, err in failures:
+        click.echo(f"failed to submit {filename}: {err}", err=True)
     click.echo(
         f"""\
 ingest document submission (task submission) complete
@@ -73,27 +235,23 @@ task IDs are visible in
     )
 
 
-def submit_handler(directory, output, index_id):
-    client = new_search_client()
+def submit_handler(directory, output, index_id, concurrency=1):
+    client = shared_search_client()
 
     os.makedirs(output, exist_ok=True)
     task_list_file = os.path.join(output, "tasks.txt")
-    with open(task_list_file, "w"):  # empty the file (open in write mode)
-        pass
 
     # ./searchable-files extract && ./searchable-files assemble &&
     # ./searchable-files submit --index-id 76c5e7eb-6cb6-492c-ba80-7e47abff0586 && ./searchable-files watch
-    if not index_id:
-        index_info = token_storage_adapter().read_config("index_info")
-        if index_info is None:
-            raise click.UsageError(
-                "Cannot submit without first setting up "
-                "an index or passing '--index-id'"
-            )
-        index_id = index_info["index_id"]
+    index_id = _resolve_index_id(index_id)
 
-    # for filename in all_filenames(directory):
-    #     submit_doc(client, index_id, filename, task_list_file)
+    failures = submit_all(
+        client, index_id, all_filenames(directory), task_list_file, concurrency
+    )
+    if failures:
+        err_msg = "; ".join(f"{filename}: {err}" for filename, err in failures)
+        print(f"[callback] err_msg={err_msg}")
+        return err_msg
 
     click.echo(
         f"""\
@@ -101,6 +259,3 @@ ingest document submission (task submission) complete
 task IDs are visible in
     {task_list_file}"""
     )
-    print(f'[callback] err_msg={"!!!"}')
-
-    pass
@@ -1,21 +1,89 @@
+import heapq
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import click
+import globus_sdk
 
-from .lib import common_options, search_client
+from .lib import common_options, prettyprint_json, search_client
+from .lib.search import call_with_retry, pool_connections
+from .lib.syncstate import SyncState
+
+TERMINAL_STATES = ("SUCCESS", "FAILED")
+
+# each task is polled quickly at first, then less and less often (up to the
+# maximum) for as long as it keeps running
+MIN_POLL_INTERVAL = 0.25
+MAX_POLL_INTERVAL = 10.0
+POLL_BACKOFF = 1.5
+
+
+def _get_task(client, task_id):
+    try:
+        return task_id, call_with_retry(client.get_task, task_id).data, None
+    except globus_sdk.GlobusError as err:
+        return task_id, None, f"{type(err).__name__}: {err}"
+
+
+def watch_tasks(client, task_ids, max_wait, concurrency=1, on_complete=None):
+    """
+    Poll tasks until each one reaches a terminal state, or until `max_wait`
+    seconds have passed since that task was first polled.
+
+    Returns a dict mapping each task ID to a `(succeeded, task_document)` pair.
+    `on_complete` is called with the same three values as soon as a task is done.
+    """
+    start = time.monotonic()
+    # (next poll time, task id, interval to use after that poll)
+    schedule = [(start, task_id, MIN_POLL_INTERVAL) for task_id in task_ids]
+    heapq.heapify(schedule)
+    # each task gets its own `max_wait`, counted from its first poll, so that a
+    # long list of tasks does not eat into the time of those polled last
+    deadlines = {}
+
+    results = {}
+
+    def finish(task_id, succeeded, doc):
+        results[task_id] = (succeeded, doc)
+        if on_complete is not None:
+            on_complete(task_id, succeeded, doc)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while schedule:
+            now = time.monotonic()
+            if schedule[0][0] > now:
+                time.sleep(schedule[0][0] - now)
+                continue
+
+            due = []
+            while schedule and schedule[0][0] <= now:
+                due.append(heapq.heappop(schedule))
+            intervals = {task_id: interval for _, task_id, interval in due}
+
+            polled = executor.map(
+                lambda task_id: _get_task(client, task_id), list(intervals)
+            )
+            for task_id, doc, err in polled:
+                now = time.monotonic()
+                deadline = deadlines.setdefault(task_id, now + max_wait)
+                if doc is not None and doc["state"] in TERMINAL_STATES:
+                    finish(task_id, doc["state"] == "SUCCESS", doc)
+                elif now >= deadline:
+                    if doc is None:
+                        doc = {"task_id": task_id, "state": "UNKNOWN", "error": err}
+                    finish(task_id, False, doc)
+                else:
+                    interval = intervals[task_id]
+                    next_poll = min(now + interval, deadline)
+                    next_interval = min(interval * POLL_BACKOFF, MAX_POLL_INTERVAL)
+                    heapq.heappush(schedule, (next_poll, task_id, next_interval))
+    return results
 
 
 def wait(client, task_id, max_wait):
-    waited = 0
-    while True:
-        res = client.get_task(task_id)
-        if res["state"] in ("SUCCESS", "FAILED"):
-            return res["state"] == "SUCCESS"
-        # wait 1s and check for timeout
-        waited += 1
-        if waited >= max_wait:
-            return False
-        time.sleep(1)
+    succeeded, _ = watch_tasks(client, [task_id], max_wait)[task_id]
+    return succeeded
 
 
 @click.command(
@@ -47,12 +115,28 @@ def wait(client, task_id, max_wait):
     help="The maximum amount of time to wait for a task to complete before "
     "assuming that it is failed",
 )
+@click.option(
+    "--concurrency",
+    default=8,
+    show_default=True,
+    type=int,
+    help="The maximum number of task status requests to have in flight at once",
+)
+@click.option(
+    "--sync-state",
+    default="output/sync_state.sqlite",
+    show_default=True,
+    help="The sync state file written by `submit`. The entries of tasks which "
+    "succeed are recorded there as synced",
+)
 @click.option(  # for easy testing of the progress bar, sleep between tasks
     "--delay", hidden=True, type=float
 )
 @common_options
-def watch_cli(task_id_file, output, max_wait, delay):
-    client = search_client()
+def watch_cli(task_id_file, output, max_wait, concurrency, sync_state, delay):
+    client = pool_connections(search_client(), concurrency)
+    # without a sync state, `submit` was run with a different one, or none
+    state = SyncState(sync_state) if os.path.exists(sync_state) else None
 
     task_ids = set()
     with open(task_id_file) as fp:
@@ -61,13 +145,42 @@ def watch_cli(task_id_file, output, max_wait, delay):
             if line:  # skip empty
                 task_ids.add(line.strip())
 
-    results = []
-    with click.progressbar(task_ids) as bar:
-        for task_id in bar:
-            results.append(wait(client, task_id, max_wait))
+    os.makedirs(output, exist_ok=True)
+
+    with click.progressbar(length=len(task_ids)) as bar:
+
+        def on_complete(task_id, succeeded, doc):
+            with open(os.path.join(output, f"{task_id}.json"), "w") as fp:
+                prettyprint_json(doc, fp)
+            # a task which is still running when we give up stays pending, and
+            # can be confirmed by a later `watch`
+            if state is not None:
+                if succeeded:
+                    state.confirm(task_id)
+                elif doc.get("state") == "FAILED":
+                    state.discard(task_id)
+            bar.update(1)
             if delay is not None:
                 time.sleep(delay)
 
+        try:
+            task_results = watch_tasks(
+                client, sorted(task_ids), max_wait, concurrency, on_complete
+            )
+        finally:
+            if state is not None:
+                state.close()
+
+    results = [succeeded for succeeded, _ in task_results.values()]
+    with open(os.path.join(output, "summary.json"), "w") as fp:
+        prettyprint_json(
+            {
+                "succeeded": sorted(t for t, (ok, _) in task_results.items() if ok),
+                "failed": sorted(t for t, (ok, _) in task_results.items() if not ok),
+            },
+            fp,
+        )
+
     n = len(results)
     if all(results):
         click.echo(f"Tasks all completed successfully ({n}/{n})")